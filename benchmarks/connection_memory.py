@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+连接记录内存基准
+比较 json 字典、Connection 对象列表和 ConnectionStore 列式存储在大量连接下每条连接占用的字节数
+"""
+
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rdp_connections import Connection, ConnectionStore  # noqa: E402
+
+USERNAMES = ("administrator", "ops", "backup", "deploy")
+PROFILES = ("lan", "broadband", "low", "auto")
+
+
+def make_config_text(count):
+    """生成与config.json格式一致的测试数据"""
+    rng = random.Random(0)
+    config = {}
+    for i in range(count):
+        config[f"server-{i:06d}"] = {
+            "host": f"host{i:06d}.branch{i % 97}.example.com",
+            "port": rng.choice((3389, 3390, 13389)),
+            "username": rng.choice(USERNAMES),
+            "password": "gAAAAAB" + "x" * 93 if i % 2 else None,
+            "profile": rng.choice(PROFILES),
+        }
+    return json.dumps(config)
+
+
+def measure(build, text):
+    """返回构建结果后仍占用的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(text)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def build_dicts(text):
+    return json.loads(text)
+
+
+def build_objects(text):
+    return [Connection.from_dict(n, d) for n, d in json.loads(text).items()]
+
+
+def build_store(text):
+    return ConnectionStore.from_config(json.loads(text))
+
+
+@click.command()
+@click.option('--count', '-n', default=100_000, help='连接数量')
+def main(count):
+    """测量每条连接占用的内存"""
+    text = make_config_text(count)
+    print(f"{'存储方式':<20}{'总计(MB)':>12}{'每条(字节)':>14}")
+    for label, build in (("dict (json)", build_dicts),
+                         ("Connection 对象", build_objects),
+                         ("ConnectionStore", build_store)):
+        size = measure(build, text)
+        print(f"{label:<20}{size / 1024 / 1024:>12.1f}{size / count:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+图形界面启动耗时基准
+多次启动 rdp_gui.py（或打包后的exe），统计首次绘制、可交互和状态加载完成的耗时，
+并检查每次启动都是先完成首次绘制、再完成加载（first_paint < interactive）
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+ROOT = Path(__file__).resolve().parent.parent
+STARTUP_BENCH_ENV = "RDPM_STARTUP_BENCH"
+PHASES = ("first_paint", "interactive", "status", "wall")
+
+
+def run_once(cmd):
+    """启动一次程序，返回各阶段耗时（秒）"""
+    fd, out_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    env = dict(os.environ, **{STARTUP_BENCH_ENV: out_file})
+    try:
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, check=True, timeout=120)
+        wall = time.perf_counter() - start
+        times = json.loads(Path(out_file).read_text(encoding='utf-8'))
+    finally:
+        os.unlink(out_file)
+    times["wall"] = wall
+    return times
+
+
+@click.command()
+@click.option('--runs', '-n', default=5, help='启动次数')
+@click.option('--exe', type=click.Path(exists=True), help='打包后的可执行文件，默认运行 rdp_gui.py')
+def main(runs, exe):
+    """测量图形界面启动耗时"""
+    cmd = [exe] if exe else [sys.executable, str(ROOT / 'rdp_gui.py')]
+    results = [run_once(cmd) for _ in range(runs)]
+    print(f"{'阶段':<12}{'中位数(ms)':>12}{'最大(ms)':>12}")
+    for phase in PHASES:
+        values = [r[phase] * 1000 for r in results if phase in r]
+        if values:
+            print(f"{phase:<12}{statistics.median(values):>12.1f}{max(values):>12.1f}")
+
+    # 加载阻塞了首次绘制时，窗口会在加载完成前一直空白
+    late = [i for i, r in enumerate(results, 1)
+            if "first_paint" not in r or "interactive" not in r
+            or r["first_paint"] >= r["interactive"]]
+    if late:
+        raise click.ClickException(
+            f"第 {', '.join(map(str, late))} 次启动没有在首次绘制之后才完成加载（first_paint >= interactive）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+RDP文件缓存
+按连接字段和性能配置的哈希值缓存生成的.rdp文件，重复连接时直接复用
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from rdp_metrics import cache_access
+from rdp_profiles import PERFORMANCE_PROFILES, RDP_TEMPLATE, render_rdp
+
+DEFAULT_PORT = 3389
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+# 模板或配置内容变化时，旧的缓存键自动失效
+_TEMPLATE_DIGEST = hashlib.sha256(
+    (RDP_TEMPLATE.template + json.dumps(PERFORMANCE_PROFILES, sort_keys=True)).encode()
+).hexdigest()[:16]
+
+
+def cache_key(connection: dict, profile: str) -> str:
+    """计算连接内容的缓存键"""
+    fields = {
+        "host": connection["host"],
+        "port": connection.get("port", DEFAULT_PORT),
+        "username": connection["username"],
+        "has_password": bool(connection.get("password")),
+        "profile": profile,
+        "template": _TEMPLATE_DIGEST,
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+class RDPFileCache:
+    """
+    内容寻址的RDP文件缓存
+    文件名即缓存键；最近使用时间记录在文件mtime上，命中时不重写文件；
+    index.json 只记录连接名称到缓存键的映射，用于按连接失效
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.index_file = self.cache_dir / 'index.json'
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, str]] = None
+
+    def _load_index(self) -> Dict[str, str]:
+        if self._index is None:
+            try:
+                self._index = json.loads(self.index_file.read_text())
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self._index, indent=2))
+        os.replace(tmp, self.index_file)
+
+    def get(self, name: str, connection: dict, profile: str) -> Path:
+        """获取连接对应的RDP文件，未命中时生成并写入缓存"""
+        key = cache_key(connection, profile)
+        path = self.cache_dir / f'{key}.rdp'
+        with self._lock:
+            index = self._load_index()
+            if path.exists():
+                self.hits += 1
+                cache_access("rdp_file", True)
+                os.utime(path)
+                if index.get(name) != key:
+                    index[name] = key
+                    self._save_index()
+                return path
+
+            self.misses += 1
+            cache_access("rdp_file", False)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(render_rdp(connection, profile))
+            os.replace(tmp, path)
+            old_key = index.get(name)
+            index[name] = key
+            if old_key and old_key != key and old_key not in index.values():
+                (self.cache_dir / f'{old_key}.rdp').unlink(missing_ok=True)
+            self._evict(keep=path)
+            self._save_index()
+            return path
+
+    def invalidate(self, name: str) -> None:
+        """删除指定连接的缓存项"""
+        with self._lock:
+            index = self._load_index()
+            key = index.pop(name, None)
+            if key is None:
+                return
+            if key not in index.values():
+                (self.cache_dir / f'{key}.rdp').unlink(missing_ok=True)
+            self._save_index()
+
+    def _entries(self):
+        """按最近使用时间从旧到新列出缓存文件"""
+        entries = []
+        for path in self.cache_dir.glob('*.rdp'):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def _evict(self, keep: Path) -> None:
+        """按LRU淘汰超出数量或大小上限的缓存文件，刚写入的keep即将被使用，不会淘汰"""
+        entries = [entry for entry in self._entries() if entry[2] != keep]
+        total = sum(size for _, size, _ in entries) + keep.stat().st_size
+        evicted = set()
+        while entries and (len(entries) + 1 > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted.add(path.stem)
+        if evicted:
+            self._index = {n: k for n, k in self._index.items() if k not in evicted}
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        with self._lock:
+            entries = self._entries() if self.cache_dir.exists() else []
+            return {
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "connections": len(self._load_index()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的文件数"""
+        with self._lock:
+            removed = 0
+            if self.cache_dir.exists():
+                for path in self.cache_dir.glob('*.rdp'):
+                    path.unlink(missing_ok=True)
+                    removed += 1
+            self._index = {}
+            self._save_index()
+            return removed
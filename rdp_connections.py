@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+连接记录
+带校验的 Connection 记录，以及按列存储大量连接的 ConnectionStore
+"""
+
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rdp_profiles import DEFAULT_PROFILE, PROFILE_NAMES
+
+DEFAULT_PORT = 3389
+DEFAULT_USERNAME = "administrator"
+
+# 连接记录的结构版本；没有schema字段的旧记录视为版本0
+SCHEMA_VERSION = 1
+
+
+def tag_list(data: dict, key: str = "tags") -> List[str]:
+    """读取JSON对象中的标签列表字段，单个字符串等其他类型视为错误"""
+    value = data.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{key} 必须是字符串列表")
+    return value
+
+
+class Connection:
+    """单个远程桌面连接"""
+    __slots__ = ("name", "host", "port", "username", "password", "profile", "tags")
+
+    def __init__(self, name: str, host: str, port: int = DEFAULT_PORT,
+                 username: str = DEFAULT_USERNAME, password: Optional[str] = None,
+                 profile: str = DEFAULT_PROFILE, tags: Iterable[str] = ()):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.profile = profile
+        if isinstance(tags, str):  # 避免把单个标签拆成字符
+            raise ValueError("标签必须是字符串列表")
+        self.tags = tuple(sorted(set(tags)))
+        self.validate()
+
+    def validate(self) -> None:
+        """校验字段，无效时抛出ValueError"""
+        if not self.host:
+            raise ValueError("主机地址不能为空")
+        try:
+            self.port = int(self.port)
+        except (TypeError, ValueError):
+            raise ValueError("端口必须是1-65535之间的数字")
+        if not 1 <= self.port <= 65535:
+            raise ValueError("端口必须是1-65535之间的数字")
+        if not isinstance(self.username, str):
+            raise ValueError("用户名必须是字符串")
+        if self.profile not in PROFILE_NAMES:
+            raise ValueError(f"未知的性能配置：{self.profile}")
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> 'Connection':
+        """从config.json中的记录创建，兼容旧版本记录"""
+        schema = data.get("schema", 0)
+        if schema > SCHEMA_VERSION:
+            raise ValueError(f"{name} 的配置版本 {schema} 高于当前支持的版本 {SCHEMA_VERSION}")
+        return cls(
+            name,
+            data["host"],
+            data.get("port", DEFAULT_PORT),
+            data.get("username", DEFAULT_USERNAME),
+            data.get("password"),
+            data.get("profile", DEFAULT_PROFILE),
+            data.get("tags", ()),
+        )
+
+    def to_dict(self) -> dict:
+        """转换为config.json中的记录"""
+        data = {
+            "host": self.host,
+            "port": self.port,
+            "username": self.username,
+            "password": self.password,
+            "profile": self.profile,
+        }
+        if self.tags:
+            data["tags"] = list(self.tags)
+        data["schema"] = SCHEMA_VERSION
+        return data
+
+    def __repr__(self) -> str:
+        return f"Connection({self.name!r}, {self.host!r}, {self.port})"
+
+
+class ConnectionStore:
+    """
+    列式连接存储
+    每个字段一列：端口和性能配置用紧凑数组，用户名驻留（intern）共享，标签稀疏存储
+    """
+    __slots__ = ("_names", "_hosts", "_ports", "_usernames", "_passwords",
+                 "_profiles", "_tags", "_index", "invalid")
+
+    def __init__(self, connections: Iterable[Connection] = ()):
+        self._names: List[str] = []
+        self._hosts: List[str] = []
+        self._ports = array('H')
+        self._usernames: List[str] = []
+        self._passwords: List[Optional[str]] = []
+        self._profiles = array('B')
+        self._tags: Dict[int, Tuple[str, ...]] = {}
+        self._index: Dict[str, int] = {}
+        # 读取时跳过的无效记录：名称 -> 原因
+        self.invalid: Dict[str, str] = {}
+        for connection in connections:
+            self.add(connection)
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'ConnectionStore':
+        """从config.json内容创建，无效记录不会中断读取，而是跳过并记录在invalid中"""
+        store = cls()
+        for name, data in config.items():
+            try:
+                store.add(Connection.from_dict(name, data))
+            except KeyError as e:
+                store.invalid[name] = f"缺少字段：{e.args[0]}"
+            except (TypeError, ValueError, AttributeError) as e:
+                store.invalid[name] = str(e)
+        return store
+
+    def add(self, connection: Connection) -> None:
+        """添加或替换连接"""
+        row = self._index.get(connection.name)
+        values = (
+            connection.host,
+            connection.port,
+            sys.intern(connection.username),
+            connection.password,
+            PROFILE_NAMES.index(connection.profile),
+        )
+        if row is None:
+            row = len(self._names)
+            self._index[connection.name] = row
+            self._names.append(connection.name)
+            self._hosts.append(values[0])
+            self._ports.append(values[1])
+            self._usernames.append(values[2])
+            self._passwords.append(values[3])
+            self._profiles.append(values[4])
+        else:
+            (self._hosts[row], self._ports[row], self._usernames[row],
+             self._passwords[row], self._profiles[row]) = values
+        if connection.tags:
+            self._tags[row] = connection.tags
+        else:
+            self._tags.pop(row, None)
+
+    def remove(self, name: str) -> None:
+        """删除连接，保持其余连接的顺序"""
+        row = self._index.pop(name)
+        for column in (self._names, self._hosts, self._ports, self._usernames,
+                       self._passwords, self._profiles):
+            del column[row]
+        self._tags = {(r - 1 if r > row else r): t for r, t in self._tags.items() if r != row}
+        for moved in self._names[row:]:
+            self._index[moved] -= 1
+
+    def _row(self, row: int) -> Connection:
+        connection = Connection.__new__(Connection)
+        connection.name = self._names[row]
+        connection.host = self._hosts[row]
+        connection.port = self._ports[row]
+        connection.username = self._usernames[row]
+        connection.password = self._passwords[row]
+        connection.profile = PROFILE_NAMES[self._profiles[row]]
+        connection.tags = self._tags.get(row, ())
+        return connection
+
+    def get(self, name: str) -> Optional[Connection]:
+        """按名称获取连接"""
+        row = self._index.get(name)
+        return None if row is None else self._row(row)
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def to_config(self) -> dict:
+        """转换为config.json内容"""
+        return {self._names[row]: self._row(row).to_dict() for row in range(len(self._names))}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self) -> Iterator[Connection]:
+        return (self._row(row) for row in range(len(self._names)))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+保存密码的凭据同步
+将连接中保存的密码写入系统凭据管理器（TERMSRV/<主机>），mstsc连接时无需再输入密码；
+通过哈希台账跳过未变化的凭据
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    import win32cred
+except ImportError:  # 未安装pywin32或非Windows平台
+    win32cred = None
+
+DEFAULT_WORKERS = 8
+# 多个连接共用同一目标但账户不同，无法只保存一份凭据
+CONFLICT = "conflict"
+
+
+class Credential(NamedTuple):
+    """待同步的凭据"""
+    name: str
+    host: str
+    username: str
+    password: str
+
+    @property
+    def target(self) -> str:
+        return f"TERMSRV/{self.host}"
+
+
+class Win32CredBackend:
+    """通过CredWrite API写入Windows凭据管理器，不需要启动子进程"""
+
+    def write(self, target: str, username: str, password: str) -> None:
+        win32cred.CredWrite({
+            'Type': win32cred.CRED_TYPE_GENERIC,
+            'TargetName': target,
+            'UserName': username,
+            'CredentialBlob': password,
+            'Persist': win32cred.CRED_PERSIST_LOCAL_MACHINE,
+        }, 0)
+
+    def delete(self, target: str) -> None:
+        win32cred.CredDelete(target, win32cred.CRED_TYPE_GENERIC, 0)
+
+
+class FakeCredentialBackend:
+    """内存中的凭据存储，用于非Windows平台测试"""
+
+    def __init__(self):
+        self.store: Dict[str, tuple] = {}
+        self.write_count = 0
+        self._lock = threading.Lock()
+
+    def write(self, target: str, username: str, password: str) -> None:
+        with self._lock:
+            self.write_count += 1
+            self.store[target] = (username, password)
+
+    def delete(self, target: str) -> None:
+        with self._lock:
+            self.store.pop(target, None)
+
+
+class UnavailableCredentialBackend:
+    """凭据管理器不可用时使用：不保存任何凭据，每次写入都报告原因"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def write(self, target: str, username: str, password: str) -> None:
+        raise RuntimeError(self.reason)
+
+    def delete(self, target: str) -> None:
+        raise RuntimeError(self.reason)
+
+
+def default_backend():
+    """
+    选择当前平台可用的凭据后端
+    不提供cmdkey后备：它需要把明文密码放在命令行上，其他进程可以读到；
+    内存后端只用于测试注入，不会自动选用，否则密码看似同步成功实际并未保存
+    """
+    if win32cred is not None:
+        return Win32CredBackend()
+    return UnavailableCredentialBackend("未安装pywin32，无法写入Windows凭据管理器")
+
+
+class CredentialSync:
+    """
+    凭据同步器
+    台账记录每个目标已写入凭据的HMAC摘要，摘要未变化时不再写入；
+    凭据按目标分组，同一目标只写入一次，账户不一致的目标不写入
+    """
+
+    def __init__(self, backend, ledger_file: Path, secret: bytes,
+                 workers: int = DEFAULT_WORKERS):
+        self.backend = backend
+        self.ledger_file = Path(ledger_file)
+        self.secret = secret
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._ledger: Optional[Dict[str, str]] = None
+
+    def _load_ledger(self) -> Dict[str, str]:
+        if self._ledger is None:
+            try:
+                self._ledger = json.loads(self.ledger_file.read_text())
+            except (OSError, ValueError):
+                self._ledger = {}
+        return self._ledger
+
+    def _save_ledger(self) -> None:
+        tmp = self.ledger_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self._ledger, indent=2))
+        os.replace(tmp, self.ledger_file)
+
+    def digest(self, credential: Credential) -> str:
+        """凭据摘要（HMAC，台账中不保存可离线猜测的明文哈希）"""
+        message = "\0".join((credential.target, credential.username, credential.password))
+        return hmac.new(self.secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def sync(self, credentials: Iterable[Credential], force: bool = False) -> Dict[str, str]:
+        """
+        并行写入有变化的凭据
+        返回: 连接名称 -> written / unchanged / conflict / 错误信息
+        """
+        groups: Dict[str, List[Credential]] = {}
+        for credential in credentials:
+            groups.setdefault(credential.target, []).append(credential)
+
+        with self._lock:
+            ledger = self._load_ledger()
+            results: Dict[str, str] = {}
+            pending = {}
+            for target, group in groups.items():
+                if len({(c.username, c.password) for c in group}) > 1:
+                    results.update((c.name, CONFLICT) for c in group)
+                    continue
+                digest = self.digest(group[0])
+                if not force and ledger.get(target) == digest:
+                    results.update((c.name, "unchanged") for c in group)
+                else:
+                    pending[target] = (group, digest)
+
+            if not pending:
+                return results
+
+            def write(item):
+                group, _ = item
+                credential = group[0]
+                self.backend.write(credential.target, credential.username, credential.password)
+
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                futures = {target: pool.submit(write, item) for target, item in pending.items()}
+                for target, future in futures.items():
+                    group, digest = pending[target]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        results.update((c.name, str(e) or e.__class__.__name__) for c in group)
+                        continue
+                    ledger[target] = digest
+                    results.update((c.name, "written") for c in group)
+            self._save_ledger()
+            return results
+
+    def forget(self, host: str) -> None:
+        """删除主机的凭据和台账记录"""
+        target = f"TERMSRV/{host}"
+        with self._lock:
+            ledger = self._load_ledger()
+            if ledger.pop(target, None) is not None:
+                self._save_ledger()
+        try:
+            self.backend.delete(target)
+        except Exception:
+            pass
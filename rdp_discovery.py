@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+RDP端口发现
+并发尝试每台主机的候选端口，发送X.224连接请求并校验连接确认，确认对方确实是远程桌面服务
+"""
+
+import asyncio
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_CANDIDATES = (3389, 3390, 3391, 3388, 13389, 33389)
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_CONCURRENCY = 256
+MAX_PORTS = 4096
+
+# TPKT头 + X.224连接请求（CR） + RDP_NEG_REQ（请求TLS和CredSSP）
+X224_CONNECTION_REQUEST = bytes([
+    0x03, 0x00, 0x00, 0x13,                          # TPKT：版本3，总长度19
+    0x0e, 0xe0, 0x00, 0x00, 0x00, 0x00, 0x00,        # X.224：长度14，CR，DST-REF/SRC-REF/类别0
+    0x01, 0x00, 0x08, 0x00, 0x03, 0x00, 0x00, 0x00,  # RDP_NEG_REQ：PROTOCOL_SSL | PROTOCOL_HYBRID
+])
+TPKT_VERSION = 0x03
+X224_CONNECTION_CONFIRM = 0xd0
+_MIN_TPKT_LENGTH = 4 + 7
+_MAX_TPKT_LENGTH = 1024
+
+
+def parse_ports(spec: str) -> List[int]:
+    """
+    解析端口列表，例如 "3389,3390-3399"
+    保持书写顺序并去重，顺序即优先级
+    """
+    ports: List[int] = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        try:
+            first = int(start)
+            last = int(end) if sep else first
+        except ValueError:
+            raise ValueError(f"无效的端口：{part}") from None
+        if not (1 <= first <= last <= 65535):
+            raise ValueError(f"无效的端口范围：{part}")
+        ports.extend(range(first, last + 1))
+    ports = list(dict.fromkeys(ports))
+    if len(ports) > MAX_PORTS:
+        raise ValueError(f"候选端口过多（最多{MAX_PORTS}个）")
+    return ports
+
+
+def is_connection_confirm(header: bytes, body: bytes) -> bool:
+    """判断TPKT数据包是否为X.224连接确认（CC）"""
+    return (len(header) == 4 and header[0] == TPKT_VERSION and len(body) >= 2
+            and body[1] & 0xf0 == X224_CONNECTION_CONFIRM)
+
+
+async def check_rdp(address: str, port: int, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """发送X.224连接请求，收到连接确认时返回True"""
+    async def exchange():
+        reader, writer = await asyncio.open_connection(address, port)
+        try:
+            writer.write(X224_CONNECTION_REQUEST)
+            await writer.drain()
+            header = await reader.readexactly(4)
+            if header[0] != TPKT_VERSION:
+                return False
+            length = struct.unpack('>H', header[2:4])[0]
+            if not (_MIN_TPKT_LENGTH <= length <= _MAX_TPKT_LENGTH):
+                return False
+            body = await reader.readexactly(length - 4)
+            return is_connection_confirm(header, body)
+        finally:
+            writer.close()
+
+    try:
+        return await asyncio.wait_for(exchange(), timeout)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return False
+
+
+async def _discover_host(address: str, ports: Sequence[int], timeout: float,
+                         semaphore: asyncio.Semaphore) -> Optional[int]:
+    async def attempt(port):
+        async with semaphore:
+            return await check_rdp(address, port, timeout)
+
+    confirmed = await asyncio.gather(*(attempt(port) for port in ports))
+    for port, ok in zip(ports, confirmed):
+        if ok:
+            return port
+    return None
+
+
+async def _discover_all(targets: Dict[str, Tuple[str, Sequence[int]]], timeout: float,
+                        concurrency: int) -> Dict[str, Optional[int]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    names = list(targets)
+    ports = await asyncio.gather(*(_discover_host(*targets[name], timeout, semaphore)
+                                   for name in names))
+    return dict(zip(names, ports))
+
+
+def discover_ports(targets: Dict[str, Tuple[str, Sequence[int]]],
+                   timeout: float = DEFAULT_TIMEOUT,
+                   concurrency: int = DEFAULT_CONCURRENCY) -> Dict[str, Optional[int]]:
+    """
+    同时探测所有主机的全部候选端口
+    targets: 名称 -> (已解析的地址, 按优先级排列的候选端口)
+    返回: 名称 -> 第一个确认为远程桌面的候选端口，均未确认时为None
+    """
+    if not targets:
+        return {}
+    return asyncio.run(_discover_all(targets, timeout, concurrency))
+
+
+def candidate_ports(saved_port: int, candidates: Iterable[int]) -> List[int]:
+    """候选端口列表，已保存的端口优先"""
+    return list(dict.fromkeys([saved_port, *candidates]))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+DNS预解析
+在批量连接和探测之前并发解析所有主机名，结果（包括解析失败）按TTL缓存
+"""
+
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from rdp_metrics import cache_access
+
+DEFAULT_TTL = 300.0
+DEFAULT_NEGATIVE_TTL = 30.0
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_CONCURRENCY = 32
+
+
+def is_ip_address(host: str) -> bool:
+    """判断是否为IP地址（无需解析）"""
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """
+    DNS解析结果缓存
+    成功结果按ttl缓存，解析失败按negative_ttl缓存；指定cache_file时持久化到磁盘
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None, ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self._entries = {
+            host: (address, expires)
+            for host, (address, expires) in data.items()
+            if expires > now
+        }
+
+    def save(self) -> None:
+        """将未过期的缓存写入磁盘"""
+        if not self.cache_file:
+            return
+        now = time.time()
+        with self._lock:
+            data = {h: e for h, e in self._entries.items() if e[1] > now}
+        tmp = self.cache_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.cache_file)
+
+    def get(self, host: str) -> Tuple[bool, Optional[str]]:
+        """返回 (是否命中, 地址)；命中且地址为None表示缓存的解析失败"""
+        with self._lock:
+            entry = self._entries.get(host.lower())
+            if entry is None:
+                return False, None
+            address, expires = entry
+            if expires <= time.time():
+                del self._entries[host.lower()]
+                return False, None
+            return True, address
+
+    def put(self, host: str, address: Optional[str]) -> None:
+        """缓存解析结果，address为None表示解析失败"""
+        ttl = self.ttl if address else self.negative_ttl
+        with self._lock:
+            self._entries[host.lower()] = (address, time.time() + ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class Resolver:
+    """并发DNS解析器"""
+
+    def __init__(self, cache: Optional[DNSCache] = None, timeout: float = DEFAULT_TIMEOUT,
+                 concurrency: int = DEFAULT_CONCURRENCY):
+        self.cache = cache or DNSCache()
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    async def _resolve_one(self, host: str, executor: ThreadPoolExecutor) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.run_in_executor(executor, socket.getaddrinfo, host, None,
+                                     0, socket.SOCK_STREAM),
+                self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return infos[0][4][0] if infos else None
+
+    async def _resolve_all(self, hosts: Iterable[str]) -> Dict[str, Optional[str]]:
+        hosts = tuple(hosts)
+        # 使用独立线程池，超时的查询不会阻塞事件循环退出
+        executor = ThreadPoolExecutor(max_workers=min(self.concurrency, len(hosts)))
+        try:
+            addresses = await asyncio.gather(*(self._resolve_one(h, executor) for h in hosts))
+        finally:
+            executor.shutdown(wait=False)
+        return dict(zip(hosts, addresses))
+
+    def resolve_all(self, hosts: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        并发解析所有主机，返回 主机 -> 地址（解析失败为None）
+        IP地址直接返回，缓存命中的主机不再查询
+        """
+        results: Dict[str, Optional[str]] = {}
+        pending = []
+        for host in dict.fromkeys(hosts):
+            if is_ip_address(host):
+                results[host] = host
+                continue
+            hit, address = self.cache.get(host)
+            cache_access("dns", hit)
+            if hit:
+                results[host] = address
+            else:
+                pending.append(host)
+
+        if pending:
+            resolved = asyncio.run(self._resolve_all(pending))
+            for host, address in resolved.items():
+                self.cache.put(host, address)
+                results[host] = address
+            self.cache.save()
+        return results
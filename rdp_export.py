@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+批量导出RDP文件
+多线程渲染连接的.rdp文件，写入目录或流式写入一个zip压缩包，内存占用与连接数量无关
+"""
+
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from rdp_connections import Connection
+from rdp_profiles import render_rdp, resolve_profile
+
+DEFAULT_WORKERS = 8
+_UNSAFE_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def _file_names(connections: Iterable[Connection]) -> Iterator[Tuple[Connection, str]]:
+    """为每个连接生成不重复的安全文件名"""
+    seen = set()
+    for connection in connections:
+        base = _UNSAFE_CHARS.sub('_', connection.name).strip(' .') or 'connection'
+        file_name, n = f"{base}.rdp", 1
+        while file_name.lower() in seen:
+            n += 1
+            file_name = f"{base}_{n}.rdp"
+        seen.add(file_name.lower())
+        yield connection, file_name
+
+
+def _bounded_map(pool: ThreadPoolExecutor, fn, items: Iterable, window: int) -> Iterator:
+    """按顺序返回结果，同时最多只有window个任务在执行或等待写出"""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _render(connection: Connection, profile: Optional[str]) -> str:
+    data = connection.to_dict()
+    return render_rdp(data, resolve_profile(data, profile))
+
+
+def export_to_directory(connections: Iterable[Connection], directory: Path,
+                        profile: Optional[str] = None, workers: int = DEFAULT_WORKERS) -> int:
+    """渲染并写入目录，每个工作线程直接写自己的文件，返回导出数量"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def write(item):
+        connection, file_name = item
+        (directory / file_name).write_text(_render(connection, profile), encoding='utf-8')
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in _bounded_map(pool, write, _file_names(connections), workers * 4):
+            count += 1
+    return count
+
+
+def export_to_zip(connections: Iterable[Connection], target: Union[Path, BinaryIO],
+                  profile: Optional[str] = None, workers: int = DEFAULT_WORKERS) -> int:
+    """
+    多线程渲染，主线程按顺序流式写入zip
+    target 可以是文件路径，也可以是不可定位的二进制流（例如标准输出）
+    """
+    def render(item):
+        connection, file_name = item
+        return file_name, _render(connection, profile)
+
+    count = 0
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as zf, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        for file_name, content in _bounded_map(pool, render, _file_names(connections), workers * 4):
+            zf.writestr(file_name, content)
+            count += 1
+    return count
+
+
+def export_rdp_files(connections: Iterable[Connection], output: Union[str, os.PathLike, BinaryIO],
+                     profile: Optional[str] = None, workers: int = DEFAULT_WORKERS,
+                     as_zip: Optional[bool] = None) -> int:
+    """
+    导出RDP文件；output 以 .zip 结尾或 as_zip 为True时写入zip，否则写入目录
+    返回导出数量
+    """
+    if not isinstance(output, (str, os.PathLike)):
+        return export_to_zip(connections, output, profile, workers)
+    output = Path(output)
+    if as_zip or (as_zip is None and output.suffix.lower() == '.zip'):
+        return export_to_zip(connections, output, profile, workers)
+    return export_to_directory(connections, output, profile, workers)
@@ -3,22 +3,71 @@
 Windows远程桌面批量管理工具 - 图形界面版本
 """
 
+import time
+
+# 进程启动时间，用于启动耗时统计
+PROCESS_START = time.perf_counter()
+
+import os
 import sys
 import json
+import hashlib
+import functools
 import subprocess
-import time
+import threading
+import traceback
+from pathlib import Path
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QPushButton, QLabel, QLineEdit, 
                            QMessageBox, QTableWidget, QTableWidgetItem, 
                            QHeaderView, QDialog, QFormLayout, QSpinBox,
-                           QGroupBox, QToolBar)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QIcon, QFont
-import rdp_manager
+                           QGroupBox, QToolBar, QComboBox)
+from PyQt6.QtCore import Qt, QTimer, QObject, QFileSystemWatcher, pyqtSignal
+from PyQt6.QtGui import QIcon, QFont, QAction, QActionGroup
+from rdp_connections import ConnectionStore
+from rdp_profiles import DEFAULT_PROFILE, PROFILE_NAMES
 
 DEFAULT_PORT = 3389
 DEFAULT_USERNAME = "administrator"
 
+# 设置该环境变量（输出文件路径）时，将启动耗时写入该文件（JSON）并退出
+STARTUP_BENCH_ENV = "RDPM_STARTUP_BENCH"
+
+# 性能分析方式（cprofile/sampling），与 rdp_profiling.PROFILE_ENV 相同
+PROFILE_ENV = "RDPM_PROFILE"
+
+# 界面卡顿阈值（毫秒），设为0时关闭卡顿监视
+STALL_THRESHOLD_ENV = "RDPM_STALL_MS"
+DEFAULT_STALL_MS = 100
+STALL_LOG_FILE = Path.home() / '.rdp_manager' / 'logs' / 'stalls.log'
+STALL_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 窗口没有收到绘制事件时，最迟在该时间（毫秒）后开始加载连接列表
+DEFERRED_INIT_FALLBACK_MS = 1000
+
+# 指标端点每次被抓取时探测连接的超时（秒）
+METRICS_PROBE_TIMEOUT = 2.0
+
+def profiled_slot(label):
+    """
+    rdp_profiling.profiled_slot 的延迟版本
+    只有开启性能分析后的调用才导入rdp_profiling，不影响启动耗时
+    """
+    def decorator(func):
+        profiled = None
+        
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            nonlocal profiled
+            if not getattr(self, 'profile_mode', None):
+                return func(self)
+            if profiled is None:
+                import rdp_profiling
+                profiled = rdp_profiling.profiled_slot(label)(func)
+            return profiled(self)
+        return wrapper
+    return decorator
+
 class AddConnectionDialog(QDialog):
     """添加连接对话框"""
     def __init__(self, parent=None):
@@ -38,6 +87,9 @@ class AddConnectionDialog(QDialog):
         self.username_edit.setText(DEFAULT_USERNAME)
         self.password_edit = QLineEdit()
         self.password_edit.setEchoMode(QLineEdit.EchoMode.Password)
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems(PROFILE_NAMES)
+        self.profile_combo.setCurrentText(DEFAULT_PROFILE)
         
         # 添加到布局
         layout.addRow("连接名称:", self.name_edit)
@@ -45,6 +97,7 @@ class AddConnectionDialog(QDialog):
         layout.addRow("端口:", self.port_spinbox)
         layout.addRow("用户名:", self.username_edit)
         layout.addRow("密码:", self.password_edit)
+        layout.addRow("性能配置:", self.profile_combo)
         
         # 按钮
         buttons = QHBoxLayout()
@@ -67,14 +120,17 @@ class AddConnectionDialog(QDialog):
             "host": self.host_edit.text(),
             "port": self.port_spinbox.value(),
             "username": self.username_edit.text(),
-            "password": self.password_edit.text()
+            "password": self.password_edit.text(),
+            "profile": self.profile_combo.currentText()
         }
 
 class PasswordTableItem(QTableWidgetItem):
     """密码单元格项，用于加密显示密码"""
-    def __init__(self, cipher):
+    # 所有密码单元格共用一个加密器，由主窗口在加载管理器后设置
+    cipher = None
+    
+    def __init__(self):
         super().__init__()
-        self.cipher = cipher
         self.encrypted_password = None
         self.setFlags(self.flags() | Qt.ItemFlag.ItemIsEditable)
         
@@ -101,16 +157,275 @@ class PasswordTableItem(QTableWidgetItem):
         else:
             self.setText("●●●●●●")
 
+def connection_hash(details):
+    """计算连接配置内容的哈希值，用于增量同步"""
+    return hashlib.sha1(json.dumps(details, sort_keys=True).encode()).hexdigest()
+
+class ConfigWatcher(QObject):
+    """
+    配置文件监视器
+    优先使用QFileSystemWatcher，无法监视时退回到定时轮询；
+    短时间内的连续写入合并为一次changed信号
+    """
+    changed = pyqtSignal()
+    
+    def __init__(self, path, debounce_ms=300, poll_ms=2000, parent=None):
+        super().__init__(parent)
+        self.path = str(path)
+        self._stamp = self._file_stamp()
+        
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(debounce_ms)
+        self._debounce.timeout.connect(self.changed.emit)
+        
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._poll = QTimer(self)
+        self._poll.setInterval(poll_ms)
+        self._poll.timeout.connect(self._on_poll)
+        if not self._watcher.addPath(self.path):
+            self._poll.start()
+    
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+    
+    def _on_file_changed(self, path):
+        # 原子替换写入会使文件从监视列表中移除，需要重新添加
+        if self.path not in self._watcher.files() and not self._watcher.addPath(self.path):
+            self._poll.start()
+        self._debounce.start()
+    
+    def _on_poll(self):
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._debounce.start()
+        if self._poll.isActive() and self._watcher.addPath(self.path):
+            self._poll.stop()
+
+class StallWatchdog(QObject):
+    """
+    界面卡顿监视器
+    主线程定时器不断更新心跳时间，监视线程发现心跳超过阈值未更新时抓取主线程的调用栈；
+    主线程恢复后将卡顿时长和调用栈写入滚动日志，并计入直方图
+    """
+    
+    def __init__(self, threshold_ms=DEFAULT_STALL_MS, log_file=STALL_LOG_FILE, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.interval = max(self.threshold / 4, 0.005)
+        self.log_file = Path(log_file)
+        self.count = 0
+        self.max_duration = 0.0
+        self.buckets = [0] * (len(STALL_BUCKETS_MS) + 1)
+        self._main_ident = threading.main_thread().ident
+        self._beat = time.monotonic()
+        self._stack = None
+        self._stop = threading.Event()
+        self._logger = None
+        
+        self._heartbeat = QTimer(self)
+        self._heartbeat.setInterval(max(int(self.interval * 1000), 1))
+        self._heartbeat.timeout.connect(self._on_heartbeat)
+        self._thread = threading.Thread(target=self._watch, name="rdpm-stall-watchdog", daemon=True)
+    
+    def start(self):
+        self._beat = time.monotonic()
+        self._heartbeat.start()
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._heartbeat.stop()
+    
+    def _on_heartbeat(self):
+        now = time.monotonic()
+        stack, self._stack = self._stack, None
+        gap = now - self._beat
+        self._beat = now
+        if stack is not None and gap > self.threshold:
+            self._record(gap, stack)
+    
+    def _watch(self):
+        # 只在监视线程中读取心跳和抓取调用栈，不接触任何Qt对象
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            if self._stack is None and time.monotonic() - beat > self.threshold:
+                frame = sys._current_frames().get(self._main_ident)
+                if frame is not None and self._beat == beat:
+                    self._stack = ''.join(traceback.format_stack(frame))
+    
+    def _record(self, duration, stack):
+        self.count += 1
+        self.max_duration = max(self.max_duration, duration)
+        ms = duration * 1000
+        index = next((i for i, bound in enumerate(STALL_BUCKETS_MS) if ms <= bound),
+                     len(STALL_BUCKETS_MS))
+        self.buckets[index] += 1
+        from rdp_metrics import GUI_STALL_DURATION
+        GUI_STALL_DURATION.observe(duration)
+        try:
+            self._get_logger().warning("界面卡顿 %.0f 毫秒，主线程调用栈：\n%s", ms, stack)
+        except OSError:
+            pass
+    
+    def _get_logger(self):
+        if self._logger is None:
+            import logging
+            from logging.handlers import RotatingFileHandler
+            self.log_file.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(self.log_file, maxBytes=1024 * 1024, backupCount=3,
+                                          encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger = logging.getLogger('rdp_manager.stalls')
+            self._logger.propagate = False
+            self._logger.setLevel(logging.WARNING)
+            self._logger.addHandler(handler)
+        return self._logger
+    
+    def histogram(self):
+        """返回 [(区间说明, 次数)]"""
+        labels = [f"≤ {bound} 毫秒" for bound in STALL_BUCKETS_MS]
+        labels.append(f"> {STALL_BUCKETS_MS[-1]} 毫秒")
+        return list(zip(labels, self.buckets))
+
+class SessionsDialog(QDialog):
+    """远程会话面板：后台并发查询所选连接主机上的会话"""
+    sessions_ready = pyqtSignal(object)
+    
+    def __init__(self, rdp, names, parent=None):
+        super().__init__(parent)
+        self.rdp = rdp
+        self.names = names
+        self.setWindowTitle("远程会话")
+        self.setMinimumSize(700, 400)
+        
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["连接名称", "主机地址", "会话ID", "用户", "状态"])
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        for i in range(5):
+            self.table.horizontalHeader().setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+        
+        buttons = QHBoxLayout()
+        self.refresh_btn = QPushButton("刷新")
+        self.refresh_btn.clicked.connect(lambda: self.load(refresh=True))
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        buttons.addStretch()
+        buttons.addWidget(self.refresh_btn)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+        
+        self.sessions_ready.connect(self.show_sessions)
+        self.load()
+    
+    def load(self, refresh=False):
+        """在后台线程查询会话"""
+        self.refresh_btn.setEnabled(False)
+        self.summary_label.setText(f"正在查询 {len(self.names)} 个连接的会话...")
+        def query():
+            self.sessions_ready.emit(self.rdp.sessions(self.names, refresh))
+        threading.Thread(target=query, daemon=True).start()
+    
+    def show_sessions(self, results):
+        """显示查询结果，用粗体标出连接用户名自己的会话"""
+        from rdp_sessions import same_user
+        self.table.setRowCount(0)
+        own_hosts = failed = 0
+        bold = QFont()
+        bold.setBold(True)
+        for name, (connection, result) in results.items():
+            if isinstance(result, Exception):
+                failed += 1
+                rows = [(name, connection.host, "-", "-", f"查询失败：{result}", False)]
+            else:
+                rows = [(name, connection.host, str(session.session_id), session.username,
+                         "活动" if session.state == "Active" else "已断开",
+                         same_user(session.username, connection.username))
+                        for session in result]
+                if any(row[5] for row in rows):
+                    own_hosts += 1
+            for *values, own in rows:
+                row = self.table.rowCount()
+                self.table.insertRow(row)
+                for col, value in enumerate(values):
+                    item = QTableWidgetItem(value)
+                    if own:
+                        item.setFont(bold)
+                    self.table.setItem(row, col, item)
+        self.summary_label.setText(
+            f"共 {len(results)} 个连接，{own_hosts} 个已有本用户会话，{failed} 个查询失败")
+        self.refresh_btn.setEnabled(True)
+
 class RDPManagerGUI(QMainWindow):
     """远程桌面管理器主窗口"""
+    # 后台线程查询到的远程桌面状态：(是否启用, 端口)
+    status_ready = pyqtSignal(bool, int)
+    
     def __init__(self):
         super().__init__()
-        self.rdp = rdp_manager.RDPManager()
+        # 管理器在窗口显示后延迟创建，避免启动时阻塞在导入和文件读写上
+        self.rdp = None
         self.show_passwords = False  # 添加密码显示状态标志
+        self.startup_times = {}
+        # 按钮操作的性能分析方式（cprofile/sampling），可通过环境变量或“调试”菜单开启
+        profile_env = os.environ.get(PROFILE_ENV)
+        self.profile_mode = None
+        if profile_env:
+            from rdp_profiling import PROFILE_MODES
+            self.profile_mode = profile_env if profile_env in PROFILE_MODES else None
+        # 指标端点在菜单中开启时才创建
+        self.metrics_server = None
+        self.status_ready.connect(self.apply_rdp_status)
         self.init_ui()
-        # 启动时检查状态
+        # 界面卡顿监视，阈值可通过环境变量调整
+        try:
+            stall_ms = int(os.environ.get(STALL_THRESHOLD_ENV, DEFAULT_STALL_MS))
+        except ValueError:
+            stall_ms = DEFAULT_STALL_MS
+        self.stall_watchdog = StallWatchdog(stall_ms, parent=self) if stall_ms > 0 else None
+        if self.stall_watchdog is not None:
+            self.stall_watchdog.start()
+        # 首次绘制后再加载连接列表和状态；窗口一直没有绘制（例如最小化启动）时由定时器兜底
+        QTimer.singleShot(DEFERRED_INIT_FALLBACK_MS, self.deferred_init)
+        
+    def paintEvent(self, event):
+        """记录首次绘制时间，并在这次绘制完成后开始加载"""
+        super().paintEvent(event)
+        if "first_paint" not in self.startup_times:
+            self.startup_times["first_paint"] = time.perf_counter() - PROCESS_START
+            QTimer.singleShot(0, self.deferred_init)
+        
+    def deferred_init(self):
+        """窗口显示后加载管理器、连接列表和远程桌面状态（只执行一次）"""
+        if self.rdp is not None:
+            return
+        import rdp_manager  # 延迟导入：依赖cryptography、pywin32、rich等较重的模块
+        self.rdp = rdp_manager.RDPManager()
+        PasswordTableItem.cipher = self.rdp._get_cipher()
+        self.refresh_connections()
+        # 监视配置文件，外部修改时增量同步表格
+        self.config_watcher = ConfigWatcher(self.rdp.config_file, parent=self)
+        self.config_watcher.changed.connect(self.sync_connections)
+        for widget in self.action_widgets:
+            widget.setEnabled(True)
+        self.statusBar().clearMessage()
+        self.startup_times["interactive"] = time.perf_counter() - PROCESS_START
+        # 状态查询需要调用sc，在后台线程执行
         self.update_rdp_status()
         
+
     def init_ui(self):
         """初始化用户界面"""
         self.setWindowTitle("远程桌面管理器")
@@ -139,7 +454,7 @@ class RDPManagerGUI(QMainWindow):
         disable_btn.clicked.connect(self.disable_rdp)
         
         refresh_btn = QPushButton("刷新状态")
-        refresh_btn.clicked.connect(self.update_rdp_status)
+        refresh_btn.clicked.connect(lambda: self.update_rdp_status(force=True))
         
         basic_controls.addWidget(self.status_label)
         basic_controls.addWidget(enable_btn)
@@ -167,13 +482,13 @@ class RDPManagerGUI(QMainWindow):
         
         # 连接列表
         self.table = QTableWidget()
-        self.table.setColumnCount(6)  # 增加复选框列
-        self.table.setHorizontalHeaderLabels(["选择", "连接名称", "主机地址", "端口", "用户名", "密码"])
+        self.table.setColumnCount(7)  # 增加复选框列
+        self.table.setHorizontalHeaderLabels(["选择", "连接名称", "主机地址", "端口", "用户名", "密码", "性能配置"])
         # 设置第一列宽度较小
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Fixed)
         self.table.setColumnWidth(0, 50)
         # 其他列自适应宽度
-        for i in range(1, 6):
+        for i in range(1, 7):
             self.table.horizontalHeader().setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
         
         # 允许编辑单元格
@@ -196,6 +511,9 @@ class RDPManagerGUI(QMainWindow):
         delete_btn = QPushButton("删除")
         delete_btn.clicked.connect(self.delete_selected)
         
+        sessions_btn = QPushButton("查看会话")
+        sessions_btn.clicked.connect(self.show_sessions)
+        
         select_all_btn = QPushButton("全选")
         select_all_btn.clicked.connect(self.select_all)
         
@@ -207,6 +525,7 @@ class RDPManagerGUI(QMainWindow):
         button_layout.addWidget(add_btn)
         button_layout.addWidget(connect_btn)
         button_layout.addWidget(delete_btn)
+        button_layout.addWidget(sessions_btn)
         
         layout.addWidget(button_group)
         
@@ -222,10 +541,42 @@ class RDPManagerGUI(QMainWindow):
         toolbar.addWidget(enable_btn)
         toolbar.addWidget(disable_btn)
         toolbar.addWidget(self.show_password_btn)  # 添加显示密码按钮
+        
+        # 连接列表排序方式（基于连接历史索引）
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItem("默认排序", None)
+        self.sort_combo.addItem("最近使用", "recency")
+        self.sort_combo.addItem("最常用", "frequency")
+        self.sort_combo.currentIndexChanged.connect(self.refresh_connections)
+        toolbar.addWidget(self.sort_combo)
         self.addToolBar(toolbar)
         
-        # 更新连接列表
-        self.refresh_connections()
+        # 调试菜单：性能分析开关
+        debug_menu = self.menuBar().addMenu("调试")
+        profile_menu = debug_menu.addMenu("性能分析")
+        profile_group = QActionGroup(self)
+        for text, mode in (("关闭", None), ("cProfile", "cprofile"), ("采样", "sampling")):
+            action = QAction(text, self, checkable=True)
+            action.setChecked(mode == self.profile_mode)
+            action.triggered.connect(lambda checked, m=mode: setattr(self, 'profile_mode', m))
+            profile_group.addAction(action)
+            profile_menu.addAction(action)
+        self.metrics_action = QAction("指标端点", self, checkable=True)
+        self.metrics_action.toggled.connect(self.toggle_metrics_server)
+        debug_menu.addAction(self.metrics_action)
+        stall_action = QAction("界面卡顿统计...", self)
+        stall_action.triggered.connect(self.show_stall_stats)
+        debug_menu.addAction(stall_action)
+        
+        # 管理器加载完成前禁用所有操作
+        self.action_widgets = [
+            enable_btn, disable_btn, refresh_btn, apply_port_btn, self.port_spinbox,
+            add_btn, connect_btn, delete_btn, sessions_btn, select_all_btn, deselect_all_btn,
+            self.show_password_btn, self.sort_combo, self.table,
+        ]
+        for widget in self.action_widgets:
+            widget.setEnabled(False)
+        self.statusBar().showMessage("正在加载连接列表...")
         
     def create_checkbox_item(self):
         """创建居中的复选框单元格"""
@@ -234,6 +585,7 @@ class RDPManagerGUI(QMainWindow):
         item.setCheckState(Qt.CheckState.Unchecked)
         return item
 
+    @profiled_slot("refresh_connections")
     def refresh_connections(self):
         """刷新连接列表"""
         # 暂时断开信号连接，防止触发itemChanged
@@ -244,26 +596,96 @@ class RDPManagerGUI(QMainWindow):
             if not config:
                 return
                 
-            connections = json.loads(config)
+            connections = self.valid_connections(json.loads(config))
             self.table.setRowCount(len(connections))
             
-            for row, (name, details) in enumerate(connections.items()):
-                # 添加复选框
-                self.table.setItem(row, 0, self.create_checkbox_item())
-                self.table.setItem(row, 1, QTableWidgetItem(name))
-                self.table.setItem(row, 2, QTableWidgetItem(details["host"]))
-                self.table.setItem(row, 3, QTableWidgetItem(str(details.get("port", DEFAULT_PORT))))
-                self.table.setItem(row, 4, QTableWidgetItem(details["username"]))
-                
-                # 添加密码列，解密显示
-                password_item = PasswordTableItem(self.rdp._get_cipher())
-                if details.get("password"):
-                    password_item.set_encrypted_password(details["password"])
-                self.table.setItem(row, 5, password_item)
+            names = connections.keys()
+            sort_by = self.sort_combo.currentData()
+            if sort_by:
+                names = self.rdp.history.order(names, sort_by)
+            
+            for row, name in enumerate(names):
+                self.set_connection_row(row, name, connections[name])
+            self._config_digest = hashlib.sha1(config.encode()).hexdigest()
         finally:
             # 重新连接信号
             self.table.itemChanged.connect(self.on_item_changed)
 
+    def valid_connections(self, config):
+        """按ConnectionStore校验配置，跳过缺少字段等无效记录并在状态栏提示"""
+        store = ConnectionStore.from_config(config)
+        if store.invalid:
+            skipped = "，".join(f"{name}（{reason}）" for name, reason in store.invalid.items())
+            self.statusBar().showMessage(f"以下连接的配置无效，已跳过：{skipped}", 10000)
+        return {name: config[name] for name in store.names()}
+
+    def set_connection_row(self, row, name, details):
+        """填充一行连接数据，保留已有的勾选状态"""
+        if self.table.item(row, 0) is None:
+            # 添加复选框
+            self.table.setItem(row, 0, self.create_checkbox_item())
+        name_item = QTableWidgetItem(name)
+        name_item.setData(Qt.ItemDataRole.UserRole, connection_hash(details))
+        self.table.setItem(row, 1, name_item)
+        self.table.setItem(row, 2, QTableWidgetItem(details["host"]))
+        self.table.setItem(row, 3, QTableWidgetItem(str(details.get("port", DEFAULT_PORT))))
+        self.table.setItem(row, 4, QTableWidgetItem(details["username"]))
+        
+        # 添加密码列，解密显示
+        password_item = PasswordTableItem()
+        if details.get("password"):
+            password_item.set_encrypted_password(details["password"])
+        password_item.update_display(self.show_passwords)
+        self.table.setItem(row, 5, password_item)
+        self.table.setItem(row, 6, QTableWidgetItem(details.get("profile", DEFAULT_PROFILE)))
+
+    def sync_connections(self):
+        """配置文件变化后按名称和内容哈希增量更新表格，只改动变化的行"""
+        try:
+            config = self.rdp.config_file.read_text()
+        except OSError:
+            return
+        digest = hashlib.sha1(config.encode()).hexdigest()
+        if digest == getattr(self, '_config_digest', None):
+            return
+        try:
+            connections = json.loads(config) if config else {}
+        except ValueError:
+            return  # 文件正在写入或格式错误，等待下一次变化
+        self._config_digest = digest
+        connections = self.valid_connections(connections)
+        
+        self.table.itemChanged.disconnect(self.on_item_changed)
+        try:
+            rows = {}
+            for row in range(self.table.rowCount()):
+                item = self.table.item(row, 1)
+                if item is not None:
+                    rows[item.text()] = row
+            
+            # 删除已不存在的连接（从后往前删除，保持行号有效）
+            for row in sorted((r for n, r in rows.items() if n not in connections), reverse=True):
+                self.table.removeRow(row)
+            rows = {self.table.item(row, 1).text(): row for row in range(self.table.rowCount())}
+            
+            # 新增的连接插入到当前排序中下一个已有连接之前
+            sort_by = self.sort_combo.currentData()
+            order = self.rdp.history.order(connections, sort_by) if sort_by else list(connections)
+            for index, name in enumerate(order):
+                details = connections[name]
+                row = rows.get(name)
+                if row is None:
+                    row = next((rows[n] for n in order[index + 1:] if n in rows), self.table.rowCount())
+                    self.table.insertRow(row)
+                    rows = {n: r + 1 if r >= row else r for n, r in rows.items()}
+                    rows[name] = row
+                elif self.table.item(row, 1).data(Qt.ItemDataRole.UserRole) == connection_hash(details):
+                    continue
+                self.set_connection_row(row, name, details)
+                self.rdp.rdp_cache.invalidate(name)
+        finally:
+            self.table.itemChanged.connect(self.on_item_changed)
+
     def on_item_changed(self, item):
         """处理表格项编辑完成事件"""
         try:
@@ -288,6 +710,7 @@ class RDPManagerGUI(QMainWindow):
                 return
             
             connection = config[name]
+            previous = self.rdp.password_hosts(config)
             
             # 根据列更新相应的值
             if col == 1:  # 连接名称
@@ -299,7 +722,11 @@ class RDPManagerGUI(QMainWindow):
                     # 更新连接名称
                     config[new_value] = config.pop(name)
             elif col == 2:  # 主机地址
-                connection["host"] = new_value
+                if not new_value.strip():
+                    QMessageBox.warning(self, "警告", "主机地址不能为空！")
+                    item.setText(connection["host"])
+                    return
+                connection["host"] = new_value.strip()
             elif col == 3:  # 端口
                 try:
                     port = int(new_value)
@@ -328,9 +755,21 @@ class RDPManagerGUI(QMainWindow):
                         password_item.set_encrypted_password(None)
                     # 恢复显示为掩码
                     password_item.update_display(self.show_passwords)
+            elif col == 6:  # 性能配置
+                if new_value not in PROFILE_NAMES:
+                    QMessageBox.warning(self, "警告", f"性能配置必须是：{', '.join(PROFILE_NAMES)}")
+                    item.setText(connection.get("profile", DEFAULT_PROFILE))
+                    return
+                connection["profile"] = new_value
             
             # 保存更新后的配置
-            self.rdp.config_file.write_text(json.dumps(config, indent=2))
+            self.rdp._save_config(config)
+            self.rdp.rdp_cache.invalidate(name)
+            self.rdp.forget_credentials(previous, config)
+            # 表格已是最新内容，更新摘要和行哈希，避免监视器再次同步这一行
+            self._config_digest = hashlib.sha1(self.rdp.config_file.read_text().encode()).hexdigest()
+            name_item = self.table.item(row, 1)
+            name_item.setData(Qt.ItemDataRole.UserRole, connection_hash(config[name_item.text()]))
             
         finally:
             # 重新连接信号
@@ -360,6 +799,7 @@ class RDPManagerGUI(QMainWindow):
                 checked.append(name)
         return checked
 
+    @profiled_slot("connect_selected")
     def connect_selected(self):
         """连接选中的远程桌面"""
         checked = self.get_checked_connections()
@@ -376,16 +816,32 @@ class RDPManagerGUI(QMainWindow):
                 QMessageBox.warning(self, "警告", "请先选择要连接的远程桌面！")
             return
 
-        # 批量连接
-        for name in checked:
-            try:
-                self.rdp.connect(name)
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"连接 {name} 失败：{str(e)}")
+        # 批量连接：预解析、凭据同步和启动都由connect_many完成
+        try:
+            errors = self.rdp.connect_many(checked)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"连接失败：{str(e)}")
+            return
+        failed = [f"{name}：{error}" for name, error in errors.items() if error is not None]
+        if failed:
+            QMessageBox.warning(self, "警告", "以下连接未能启动：\n" + "\n".join(failed))
     
-    def update_rdp_status(self):
+    def update_rdp_status(self, force=False):
+        """在后台线程查询远程桌面状态，完成后更新显示"""
+        def query():
+            enabled, current_port = self.rdp.get_rdp_status(force=force)
+            self.status_ready.emit(enabled, current_port)
+        threading.Thread(target=query, daemon=True).start()
+    
+    def apply_rdp_status(self, enabled, current_port):
         """更新远程桌面状态显示"""
-        enabled, current_port = self.rdp.get_rdp_status()
+        if "status" not in self.startup_times:
+            self.startup_times["status"] = time.perf_counter() - PROCESS_START
+            bench_file = os.environ.get(STARTUP_BENCH_ENV)
+            if bench_file:
+                with open(bench_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.startup_times, f)
+                QTimer.singleShot(0, QApplication.instance().quit)
         if enabled:
             self.status_label.setText(f"远程桌面状态: 已启用 (端口: {current_port})")
             self.status_label.setStyleSheet("color: green")
@@ -395,6 +851,7 @@ class RDPManagerGUI(QMainWindow):
         # 更新端口显示
         self.port_spinbox.setValue(current_port)
     
+    @profiled_slot("enable_rdp")
     def enable_rdp(self):
         """启用远程桌面"""
         try:
@@ -414,6 +871,7 @@ class RDPManagerGUI(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"禁用远程桌面时出错：{str(e)}")
     
+    @profiled_slot("apply_port_settings")
     def apply_port_settings(self):
         """应用端口设置"""
         try:
@@ -423,11 +881,15 @@ class RDPManagerGUI(QMainWindow):
             
             # 直接重启远程桌面服务
             try:
+                from rdp_metrics import SUBPROCESS_TOTAL
+                SUBPROCESS_TOTAL.inc(command='net')
                 subprocess.run(['net', 'stop', 'TermService', '/y'], 
                              capture_output=True)
                 time.sleep(2)
+                SUBPROCESS_TOTAL.inc(command='net')
                 subprocess.run(['net', 'start', 'TermService'], 
                              capture_output=True)
+                self.rdp.state.invalidate()
             except Exception as e:
                 QMessageBox.warning(self, "警告", f"重启服务时出错：{str(e)}")
                 return
@@ -463,7 +925,8 @@ class RDPManagerGUI(QMainWindow):
                     data["host"], 
                     data["username"], 
                     data["password"],
-                    data["port"]
+                    data["port"],
+                    data["profile"]
                 )
                 self.refresh_connections()
                 QMessageBox.information(self, "成功", "连接已成功添加！")
@@ -485,13 +948,72 @@ class RDPManagerGUI(QMainWindow):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            config = eval(self.rdp.config_file.read_text())
+            config = self.rdp._load_config()
             if name in config:
+                previous = self.rdp.password_hosts(config)
                 del config[name]
-                self.rdp.config_file.write_text(str(config))
+                self.rdp._save_config(config)
+                self.rdp.rdp_cache.invalidate(name)
+                self.rdp.forget_credentials(previous, config)
                 self.refresh_connections()
                 QMessageBox.information(self, "成功", "连接已成功删除！")
 
+    def show_sessions(self):
+        """查看勾选连接（未勾选时为全部连接）主机上的远程会话"""
+        names = self.get_checked_connections()
+        if not names:
+            names = [self.table.item(row, 1).text() for row in range(self.table.rowCount())]
+        if not names:
+            QMessageBox.warning(self, "警告", "没有可查询的远程桌面连接！")
+            return
+        SessionsDialog(self.rdp, names, self).exec()
+
+    def on_profile_written(self, path):
+        """性能分析文件写入后在状态栏提示"""
+        self.statusBar().showMessage(f"性能分析已保存：{path}", 10000)
+
+    def show_stall_stats(self):
+        """显示界面卡顿次数和时长分布"""
+        watchdog = self.stall_watchdog
+        if watchdog is None:
+            QMessageBox.information(self, "界面卡顿统计",
+                                    f"卡顿监视未开启（{STALL_THRESHOLD_ENV}=0）")
+            return
+        lines = [f"阈值：{watchdog.threshold * 1000:.0f} 毫秒",
+                 f"卡顿次数：{watchdog.count}",
+                 f"最长卡顿：{watchdog.max_duration * 1000:.0f} 毫秒", ""]
+        lines.extend(f"{label}：{count}" for label, count in watchdog.histogram())
+        lines.extend(["", f"日志：{watchdog.log_file}"])
+        QMessageBox.information(self, "界面卡顿统计", "\n".join(lines))
+
+    def toggle_metrics_server(self, checked):
+        """启动或停止本地HTTP指标端点"""
+        if not checked:
+            if self.metrics_server is not None and self.metrics_server.running:
+                self.metrics_server.stop()
+                self.statusBar().showMessage("指标端点已停止", 5000)
+            return
+        if self.metrics_server is None:
+            from rdp_metrics import MetricsServer  # 依赖http.server，用到时才导入
+            self.metrics_server = MetricsServer(render=self.collect_metrics)
+        try:
+            self.metrics_server.start()
+        except OSError as e:
+            QMessageBox.warning(self, "警告", f"无法启动指标端点：{str(e)}")
+            self.metrics_action.setChecked(False)
+            return
+        host, port = self.metrics_server.address
+        self.statusBar().showMessage(f"指标端点：http://{host}:{port}/metrics", 10000)
+
+    def collect_metrics(self):
+        """
+        指标端点被抓取时在端点线程中调用：先探测所有连接，
+        再返回与CLI各次操作累加后的全部指标
+        """
+        from rdp_metrics import registry
+        self.rdp.probe(timeout=METRICS_PROBE_TIMEOUT)
+        return registry.render(registry.persist(self.rdp.metrics_file))
+
     def toggle_password_display(self):
         """切换密码显示状态"""
         self.show_passwords = not self.show_passwords
@@ -509,7 +1031,12 @@ def main():
     app = QApplication(sys.argv)
     window = RDPManagerGUI()
     window.show()
-    sys.exit(app.exec())
+    code = app.exec()
+    if window.rdp is not None:
+        # 界面中的操作和卡顿指标也累加到状态文件
+        import rdp_manager
+        rdp_manager.save_metrics()
+    sys.exit(code)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
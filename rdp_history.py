@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+连接历史与启动耗时统计
+每次连接追加一行到 history.log，定期合并进预聚合的索引文件
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# 日志超过该大小时合并进索引
+COMPACT_BYTES = 64 * 1024
+# 每个连接保留的最近耗时样本数
+MAX_SAMPLES = 200
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算百分位数"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class HistoryStore:
+    """
+    连接历史存储
+    history.log: 每行一个紧凑的JSON数组 [时间戳, 名称, 主机, 启动耗时ms, 可达性耗时ms, 是否成功]
+    history_index.json: 按连接名称聚合的次数、失败数、最近使用时间和耗时样本
+    """
+
+    def __init__(self, config_dir: Path, compact_bytes: int = COMPACT_BYTES):
+        self.log_file = Path(config_dir) / 'history.log'
+        self.index_file = Path(config_dir) / 'history_index.json'
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+
+    def record(self, name: str, host: str, launch_ms: Optional[float],
+               reach_ms: Optional[float] = None, ok: bool = True) -> None:
+        """追加一条连接记录"""
+        line = json.dumps([
+            round(time.time(), 3), name, host,
+            None if launch_ms is None else round(launch_ms, 2),
+            None if reach_ms is None else round(reach_ms, 2),
+            1 if ok else 0,
+        ], ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            with self.log_file.open('a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                size = f.tell()
+            if size >= self.compact_bytes:
+                self._compact()
+
+    def _read_index(self) -> Dict[str, dict]:
+        try:
+            return json.loads(self.index_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _read_log(self) -> Iterable[list]:
+        try:
+            with self.log_file.open(encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # 忽略写入中断造成的残行
+        except OSError:
+            return
+
+    @staticmethod
+    def _fold(index: Dict[str, dict], records: Iterable[list]) -> Dict[str, dict]:
+        """将日志记录合并进聚合索引"""
+        for ts, name, host, launch_ms, reach_ms, ok in records:
+            entry = index.setdefault(name, {
+                "host": host, "count": 0, "failures": 0,
+                "last_used": 0, "samples": [],
+            })
+            entry["host"] = host
+            entry["count"] += 1
+            entry["last_used"] = max(entry["last_used"], ts)
+            if not ok:
+                entry["failures"] += 1
+            if launch_ms is not None:
+                entry["samples"].append(launch_ms)
+                del entry["samples"][:-MAX_SAMPLES]
+        return index
+
+    def _compact(self) -> None:
+        index = self._fold(self._read_index(), self._read_log())
+        tmp = self.index_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(index, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.index_file)
+        self.log_file.write_text('', encoding='utf-8')
+
+    def compact(self) -> None:
+        """立即将日志合并进索引"""
+        with self._lock:
+            self._compact()
+
+    def summary(self) -> Dict[str, dict]:
+        """返回按连接名称聚合的历史（索引 + 尚未合并的日志）"""
+        with self._lock:
+            return self._fold(self._read_index(), self._read_log())
+
+    def host_stats(self) -> List[dict]:
+        """按主机汇总启动耗时百分位和失败率"""
+        hosts: Dict[str, dict] = {}
+        for entry in self.summary().values():
+            agg = hosts.setdefault(entry["host"], {
+                "host": entry["host"], "count": 0, "failures": 0, "samples": [],
+            })
+            agg["count"] += entry["count"]
+            agg["failures"] += entry["failures"]
+            agg["samples"].extend(entry["samples"])
+        return [
+            {
+                "host": agg["host"],
+                "count": agg["count"],
+                "failures": agg["failures"],
+                "failure_rate": agg["failures"] / agg["count"] if agg["count"] else 0.0,
+                "p50": percentile(agg["samples"], 50),
+                "p95": percentile(agg["samples"], 95),
+            }
+            for agg in sorted(hosts.values(), key=lambda a: a["host"])
+        ]
+
+    def order(self, names: Iterable[str], by: str) -> List[str]:
+        """按最近使用（recency）或使用次数（frequency）排序连接名称"""
+        summary = self.summary()
+        if by == 'recency':
+            key = lambda n: summary.get(n, {}).get("last_used", 0)
+        elif by == 'frequency':
+            key = lambda n: summary.get(n, {}).get("count", 0)
+        else:
+            raise ValueError(f"未知的排序方式：{by}")
+        return sorted(names, key=key, reverse=True)
@@ -7,25 +7,60 @@ Windows远程桌面批量管理工具
 import os
 import sys
 import json
+import fnmatch
 import click
-import winreg
 import subprocess
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
 from rich.console import Console
 from rich.table import Table
-from cryptography.fernet import Fernet
-from win32com.shell import shell, shellcon
-import win32security
-import win32api
-import win32con
-import win32process
-import win32event
+from cryptography.fernet import Fernet, InvalidToken
+from win32com.shell import shell
+from rdp_cache import RDPFileCache
+from rdp_connections import Connection, ConnectionStore, tag_list
+from rdp_credentials import CONFLICT, Credential, CredentialSync, default_backend
+from rdp_discovery import DEFAULT_CANDIDATES, candidate_ports, discover_ports, parse_ports
+from rdp_dns import DNSCache, Resolver
+from rdp_export import export_rdp_files
+from rdp_history import HistoryStore
+from rdp_metrics import (DEFAULT_METRICS_PORT, METRICS_STATE_FILE, METRICS_TEXTFILE_ENV,
+                         SUBPROCESS_TOTAL, MetricsServer, cache_access, record_probe,
+                         registry, timed_operation)
+from rdp_profiling import PROFILE_MODES, Profiler
+from rdp_profiles import (DEFAULT_PROFILE, PROFILE_NAMES, measure_latency,
+                          resolve_profile)
+from rdp_registry import RDPState
+from rdp_sessions import SessionInventory, same_user
 
 console = Console()
 DEFAULT_PORT = 3389
 DEFAULT_USERNAME = "administrator"
 
+@contextmanager
+def messages_to_stderr():
+    """提示信息改为输出到标准错误，标准输出只保留机器可读的结果"""
+    console.file = sys.stderr
+    try:
+        yield
+    finally:
+        console.file = None
+
+def save_metrics() -> None:
+    """
+    命令结束时把本进程的指标累加到状态文件
+    设置了textfile环境变量时同时更新该文件，每次CLI操作的指标都能被采集
+    """
+    try:
+        state = registry.persist(Path.home() / '.rdp_manager' / METRICS_STATE_FILE)
+        textfile = os.environ.get(METRICS_TEXTFILE_ENV)
+        if textfile:
+            registry.write_textfile(Path(textfile), state)
+    except OSError as e:
+        Console(stderr=True).print(f"[yellow]警告：保存运行指标失败：{str(e)}[/yellow]")
+
 # 添加进程创建标志
 CREATE_NO_WINDOW = 0x08000000
 
@@ -36,7 +71,15 @@ class RDPManager:
         self.config_dir = Path.home() / '.rdp_manager'
         self.config_file = self.config_dir / 'config.json'
         self.key_file = self.config_dir / '.key'
+        self.metrics_file = self.config_dir / METRICS_STATE_FILE
         self._init_config()
+        self.state = RDPState(service_probe=self._query_service_running)
+        self.rdp_cache = RDPFileCache(self.config_dir / 'rdp_cache')
+        self.history = HistoryStore(self.config_dir)
+        self.resolver = Resolver(DNSCache(self.config_dir / 'dns_cache.json'))
+        self.session_inventory = SessionInventory()
+        self.credentials = CredentialSync(default_backend(), self.config_dir / 'cred_ledger.json',
+                                          self.key_file.read_bytes())
         
     def _init_config(self) -> None:
         """初始化配置目录和文件"""
@@ -48,10 +91,69 @@ class RDPManager:
             self.config_file.write_text('{}')
             
     def _get_cipher(self) -> Fernet:
-        """获取加密器"""
-        key = self.key_file.read_bytes()
-        return Fernet(key)
-        
+        """获取加密器（只读取一次密钥文件）"""
+        hit = getattr(self, '_cipher', None) is not None
+        cache_access("cipher", hit)
+        if not hit:
+            key = self.key_file.read_bytes()
+            self._cipher = Fernet(key)
+        return self._cipher
+
+    def _load_config(self) -> dict:
+        """读取连接配置"""
+        return json.loads(self.config_file.read_text())
+
+    def _save_config(self, config: dict) -> None:
+        """原子写入连接配置，避免写入中断导致文件损坏"""
+        tmp = self.config_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(config, indent=2))
+        os.replace(tmp, self.config_file)
+
+    def _make_connection(self, cipher: Fernet, name: str, host: str,
+                         username: str = DEFAULT_USERNAME, password: Optional[str] = None,
+                         port: int = DEFAULT_PORT, profile: str = DEFAULT_PROFILE,
+                         tags: Iterable[str] = ()) -> dict:
+        """校验字段并构造连接配置"""
+        encrypted = cipher.encrypt(password.encode()).decode() if password else None
+        return Connection(name, host, port, username, encrypted, profile, tags).to_dict()
+
+    def connections(self) -> ConnectionStore:
+        """
+        以列式存储返回所有连接（只读视图）
+        配置文件未变化时复用上次解析的结果
+        """
+        st = self.config_file.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = getattr(self, '_store', None)
+        hit = cached is not None and cached[0] == stamp
+        cache_access("config", hit)
+        if not hit:
+            cached = (stamp, ConnectionStore.from_config(self._load_config()))
+            self._store = cached
+            invalid = cached[1].invalid
+            if invalid:
+                skipped = ', '.join(f"{name}（{reason}）" for name, reason in invalid.items())
+                console.print(f"[yellow]以下连接的配置无效，已跳过：{skipped}[/yellow]")
+        return cached[1]
+
+    def _as_store(self, config=None) -> ConnectionStore:
+        """
+        统一按ConnectionStore读取连接，缺少字段等无效记录都会被跳过
+        config: None使用缓存的配置，也可以是配置内容（dict）或已经校验过的ConnectionStore
+        """
+        if config is None:
+            return self.connections()
+        if isinstance(config, ConnectionStore):
+            return config
+        return ConnectionStore.from_config(config)
+
+    @staticmethod
+    def _missing(store: ConnectionStore, name: str) -> str:
+        """连接不存在或配置无效时的原因"""
+        if name in store.invalid:
+            return f"{name} 的配置无效：{store.invalid[name]}"
+        return f"未找到名为 {name} 的远程桌面配置"
+
     def _is_admin(self) -> bool:
         """检查是否具有管理员权限"""
         try:
@@ -74,6 +176,7 @@ class RDPManager:
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         startupinfo.wShowWindow = subprocess.SW_HIDE
+        SUBPROCESS_TOTAL.inc(command=cmd[0])
         
         try:
             return subprocess.run(
@@ -92,6 +195,11 @@ class RDPManager:
                 raise
             return subprocess.CompletedProcess(cmd, e.returncode, e.stdout, e.stderr)
         
+    def _query_service_running(self) -> bool:
+        """查询远程桌面服务是否正在运行"""
+        result = self._run_command(['sc', 'query', 'TermService'], check=False)
+        return "RUNNING" in (result.stdout or "")
+
     def _wait_for_service_status(self, desired_status, timeout=30):
         """等待服务达到期望状态"""
         import time
@@ -109,6 +217,7 @@ class RDPManager:
                 pass
         return False
 
+    @timed_operation("change_port")
     def change_rdp_port(self, port: int = DEFAULT_PORT) -> None:
         """修改远程桌面端口"""
         import time
@@ -128,10 +237,7 @@ class RDPManager:
                     console.print("[yellow]警告：无法完全停止服务，将继续尝试修改端口...[/yellow]")
             
             # 3. 修改注册表中的端口设置
-            reg_path = r"SYSTEM\CurrentControlSet\Control\Terminal Server\WinStations\RDP-Tcp"
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path, 0, 
-                              winreg.KEY_ALL_ACCESS) as key:
-                winreg.SetValueEx(key, "PortNumber", 0, winreg.REG_DWORD, port)
+            self.state.set_value("PortNumber", port)
             
             # 4. 配置防火墙规则
             try:
@@ -171,8 +277,8 @@ class RDPManager:
             time.sleep(2)
             
             # 7. 验证最终状态
-            final_status = self._run_command(['sc', 'query', 'TermService'])
-            if "RUNNING" in final_status.stdout:
+            self.state.invalidate()
+            if self.state.snapshot().service_running:
                 console.print("[green]远程桌面端口修改成功！[/green]")
             else:
                 console.print("[yellow]警告：服务可能未正常启动，但端口已经修改。请手动检查服务状态。[/yellow]")
@@ -182,6 +288,7 @@ class RDPManager:
             console.print(f"[red]修改端口时出错：{error_msg}[/red]")
             raise
 
+    @timed_operation("enable")
     def enable_rdp(self, port: int = DEFAULT_PORT) -> None:
         """启用远程桌面"""
         import time
@@ -194,18 +301,10 @@ class RDPManager:
                 pass  # 忽略停止服务的错误
             
             # 2. 修改注册表启用远程桌面
-            reg_path = r"System\CurrentControlSet\Control\Terminal Server"
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path, 0, 
-                              winreg.KEY_ALL_ACCESS) as key:
-                winreg.SetValueEx(key, "fDenyTSConnections", 0, 
-                                winreg.REG_DWORD, 0)
+            self.state.set_value("fDenyTSConnections", 0)
                 
             # 3. 启用Network Level Authentication (NLA)
-            reg_path = r"System\CurrentControlSet\Control\Terminal Server\WinStations\RDP-Tcp"
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path, 0, 
-                              winreg.KEY_ALL_ACCESS) as key:
-                winreg.SetValueEx(key, "UserAuthentication", 0, 
-                                winreg.REG_DWORD, 1)
+            self.state.set_value("UserAuthentication", 1)
             
             # 4. 设置端口
             self.change_rdp_port(port)
@@ -223,8 +322,8 @@ class RDPManager:
             time.sleep(2)
             
             # 7. 验证最终状态
-            final_status = self._run_command(['sc', 'query', 'TermService'])
-            if "RUNNING" in final_status.stdout:
+            self.state.invalidate()
+            if self.state.snapshot().service_running:
                 console.print("[green]远程桌面已成功启用！[/green]")
             else:
                 console.print("[yellow]警告：服务可能未正常启动，但远程桌面已启用。请手动检查服务状态。[/yellow]")
@@ -264,18 +363,17 @@ class RDPManager:
                 self._run_command(['net', 'start', 'TermService'], check=False)
             except:
                 pass
+            self.state.invalidate()
             raise
             
+    @timed_operation("disable")
     def disable_rdp(self) -> None:
         """禁用远程桌面"""
         self._require_admin()
         try:
-            reg_path = r"System\CurrentControlSet\Control\Terminal Server"
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path, 0, 
-                              winreg.KEY_ALL_ACCESS) as key:
-                winreg.SetValueEx(key, "fDenyTSConnections", 0, 
-                                winreg.REG_DWORD, 1)
+            self.state.set_value("fDenyTSConnections", 1)
                                 
+            SUBPROCESS_TOTAL.inc(command='netsh')
             subprocess.run(['netsh', 'advfirewall', 'firewall', 'set', 'rule',
                           'group="远程桌面"', 'new', 'enable=No'],
                          check=True, capture_output=True)
@@ -286,27 +384,23 @@ class RDPManager:
             raise
             
     def add_connection(self, name: str, host: str, username: str = DEFAULT_USERNAME, 
-                      password: Optional[str] = None, port: int = DEFAULT_PORT) -> None:
+                      password: Optional[str] = None, port: int = DEFAULT_PORT,
+                      profile: str = DEFAULT_PROFILE) -> None:
         """添加新的远程桌面连接配置"""
-        config = json.loads(self.config_file.read_text())
-        cipher = self._get_cipher()
-        
-        connection = {
-            "host": host,
-            "port": port,
-            "username": username,
-            "password": cipher.encrypt(password.encode()).decode() if password else None
-        }
-        
-        config[name] = connection
-        self.config_file.write_text(json.dumps(config, indent=2))
+        config = self._load_config()
+        previous = self.password_hosts(config)
+        config[name] = self._make_connection(self._get_cipher(), name, host, username,
+                                             password, port, profile)
+        self._save_config(config)
+        self.rdp_cache.invalidate(name)
+        self.forget_credentials(previous, config)
         console.print(f"[green]已添加远程桌面配置：{name}[/green]")
         
     def list_connections(self) -> None:
         """列出所有保存的远程桌面连接"""
-        config = json.loads(self.config_file.read_text())
+        connections = self.connections()
         
-        if not config:
+        if not connections:
             console.print("[yellow]没有保存的远程桌面配置[/yellow]")
             return
             
@@ -315,95 +409,432 @@ class RDPManager:
         table.add_column("主机地址")
         table.add_column("端口")
         table.add_column("用户名")
+        table.add_column("性能配置")
         
-        for name, details in config.items():
+        for connection in connections:
             table.add_row(
-                name,
-                details["host"],
-                str(details.get("port", DEFAULT_PORT)),
-                details["username"]
+                connection.name,
+                connection.host,
+                str(connection.port),
+                connection.username,
+                connection.profile
             )
             
         console.print(table)
         
-    def connect(self, name: str) -> None:
-        """连接到指定的远程桌面"""
-        config = json.loads(self.config_file.read_text())
+    def connect(self, name: str, profile: Optional[str] = None,
+                check_reachable: bool = False, address: Optional[str] = None) -> None:
+        """
+        连接到指定的远程桌面
+        profile: 临时指定性能配置，默认使用连接保存的配置
+        check_reachable: 启动前检查主机端口是否可达
+        address: 已预解析的主机地址，用于可达性检查和延迟测量
+        """
+        start = time.perf_counter()
+        store = self.connections()
         
-        if name not in config:
-            console.print(f"[red]未找到名为 {name} 的远程桌面配置[/red]")
+        if name not in store:
+            console.print(f"[red]{self._missing(store, name)}[/red]")
             return
-            
-        connection = config[name]
-        rdp_file = Path.home() / 'temp.rdp'
+        synced = self.sync_credentials([name], config=store)
+        self._launch(name, self._prompting(store.get(name).to_dict(), synced.get(name)), start,
+                     profile, check_reachable, address)
+
+    def _launch(self, name: str, connection: dict, start: float, profile: Optional[str] = None,
+                check_reachable: bool = False, address: Optional[str] = None) -> Optional[str]:
+        """生成RDP文件并启动mstsc，记录启动耗时，返回失败原因（成功为None）"""
+        host = connection["host"]
         
-        # 生成RDP文件
-        rdp_content = f"""
-screen mode id:i:2
-use multimon:i:0
-desktopwidth:i:1920
-desktopheight:i:1080
-session bpp:i:32
-winposstr:s:0,1,0,0,800,600
-compression:i:1
-keyboardhook:i:2
-audiocapturemode:i:0
-videoplaybackmode:i:1
-connection type:i:7
-networkautodetect:i:1
-bandwidthautodetect:i:1
-displayconnectionbar:i:1
-username:s:{connection["username"]}
-full address:s:{connection["host"]}:{connection.get("port", DEFAULT_PORT)}
-prompt for credentials:i:{"1" if not connection["password"] else "0"}
-"""
-        rdp_file.write_text(rdp_content)
+        reach_ms = None
+        if check_reachable:
+            reach_ms = measure_latency(address or host, connection.get("port", DEFAULT_PORT))
+            if reach_ms is None:
+                console.print(f"[yellow]警告：{name} ({host}) 当前不可达[/yellow]")
+        
+        # 按性能配置获取RDP文件，内容未变时直接复用缓存
+        rdp_file = self.rdp_cache.get(name, connection,
+                                      resolve_profile(connection, profile, address))
         
         try:
+            SUBPROCESS_TOTAL.inc(command='mstsc')
             subprocess.Popen(['mstsc', str(rdp_file)])
-            console.print(f"[green]正在连接到 {name}...[/green]")
         except Exception as e:
+            self.history.record(name, host, None, reach_ms, ok=False)
             console.print(f"[red]连接失败：{str(e)}[/red]")
-        finally:
-            # 延迟删除RDP文件
-            import threading
-            import time
-            def delete_file():
-                time.sleep(5)
-                rdp_file.unlink(missing_ok=True)
-            threading.Thread(target=delete_file).start()
-
-    def get_rdp_status(self) -> tuple[bool, int]:
+            return f"启动mstsc失败：{str(e)}"
+        launch_ms = (time.perf_counter() - start) * 1000
+        ok = not check_reachable or reach_ms is not None
+        self.history.record(name, host, launch_ms, reach_ms, ok=ok)
+        console.print(f"[green]正在连接到 {name}...[/green]")
+        return None if ok else f"主机不可达：{host}"
+
+    def sync_credentials(self, names: Optional[Iterable[str]] = None, force: bool = False,
+                         config=None) -> Dict[str, str]:
+        """
+        将连接保存的密码同步到系统凭据管理器，未变化的凭据不会重复写入
+        同一主机的凭据只有一份，其他共用该主机的连接也参与账户冲突检查
+        返回: 连接名称 -> written / unchanged / conflict / 错误信息
+        """
+        store = self._as_store(config)
+        names = set(store.names() if names is None else names)
+        hosts = {store.get(name).host for name in names if name in store}
+        cipher = self._get_cipher()
+        credentials = []
+        for connection in store:
+            if connection.host not in hosts or not connection.password:
+                continue
+            try:
+                password = cipher.decrypt(connection.password.encode()).decode()
+            except InvalidToken:
+                console.print(f"[yellow]警告：{connection.name} 的密码无法解密，已跳过凭据同步[/yellow]")
+                continue
+            credentials.append(Credential(connection.name, connection.host,
+                                          connection.username, password))
+
+        results = self.credentials.sync(credentials, force)
+        conflicts: Dict[str, List[str]] = {}
+        for name, status in results.items():
+            if status == CONFLICT:
+                conflicts.setdefault(store.get(name).host, []).append(name)
+            elif status not in ("written", "unchanged") and name in names:
+                console.print(f"[yellow]警告：{name} 的凭据写入失败：{status}[/yellow]")
+        for host, group in conflicts.items():
+            console.print(f"[yellow]警告：{', '.join(sorted(group))} 使用同一主机 {host} 但账户不同，"
+                          f"未写入凭据，连接时需手动输入密码[/yellow]")
+        return {name: status for name, status in results.items() if name in names}
+
+    @staticmethod
+    def _prompting(connection: dict, status: Optional[str]) -> dict:
+        """凭据因账户冲突未写入时，生成的RDP文件保持提示输入密码"""
+        return dict(connection, password=None) if status == CONFLICT else connection
+
+    @staticmethod
+    def password_hosts(config: dict) -> set:
+        """保存了密码的连接所用的主机"""
+        return {details.get("host") for details in config.values() if details.get("password")}
+
+    def forget_credentials(self, previous_hosts: Iterable[str], config: dict) -> None:
+        """
+        删除已经没有连接保存密码的主机凭据
+        在删除连接、清除密码或修改主机并保存配置后调用；previous_hosts为修改前的password_hosts
+        """
+        for host in set(previous_hosts) - self.password_hosts(config):
+            self.credentials.forget(host)
+
+    def pre_resolve(self, config, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        并发预解析连接的主机地址，解析失败的连接会提前统一报告
+        config: 配置内容或ConnectionStore，不存在或无效的连接被忽略
+        返回: 连接名称 -> 地址（解析失败为None）
+        """
+        store = self._as_store(config)
+        hosts = {name: store.get(name).host for name in names if name in store}
+        addresses = self.resolver.resolve_all(hosts.values())
+        resolved = {name: addresses[host] for name, host in hosts.items()}
+        failed = [f"{name} ({hosts[name]})" for name, address in resolved.items() if address is None]
+        if failed:
+            console.print(f"[yellow]以下连接的主机无法解析：{', '.join(failed)}[/yellow]")
+        return resolved
+
+    def connect_many(self, names: Iterable[str], profile: Optional[str] = None,
+                     check_reachable: bool = False, config=None) -> Dict[str, Optional[str]]:
+        """
+        批量连接，启动前并发预解析所有主机，跳过无法解析的连接
+        config: 配置内容或ConnectionStore，默认读取当前配置
+        返回: 连接名称 -> 失败原因，成功启动为None
+        """
+        store = self._as_store(config)
+        results: Dict[str, Optional[str]] = {}
+        for name in names:
+            if name not in store:
+                results[name] = self._missing(store, name)
+                console.print(f"[red]{results[name]}[/red]")
+        addresses = self.pre_resolve(store, names)
+        # 启动前并行写入所有保存的密码
+        synced = self.sync_credentials([n for n, a in addresses.items() if a is not None],
+                                       config=store)
+        for name, address in addresses.items():
+            connection = store.get(name)
+            if address is None:
+                results[name] = f"主机无法解析：{connection.host}"
+            else:
+                details = self._prompting(connection.to_dict(), synced.get(name))
+                results[name] = self._launch(name, details, time.perf_counter(),
+                                             profile, check_reachable, address)
+        return results
+
+    def probe(self, names: Optional[Iterable[str]] = None, timeout: float = 2.0,
+              config=None) -> Dict[str, Optional[float]]:
+        """
+        并发探测连接的可达性
+        config: 配置内容或ConnectionStore，默认读取当前配置
+        返回: 连接名称 -> TCP建连耗时（毫秒），不可达或无法解析为None；不存在或无效的连接不包含在内
+        """
+        store = self._as_store(config)
+        names = store.names() if names is None else [n for n in names if n in store]
+        addresses = self.pre_resolve(store, names)
+        targets = [(name, address, store.get(name).port)
+                   for name, address in addresses.items() if address is not None]
+        results: Dict[str, Optional[float]] = dict.fromkeys(addresses)
+        if targets:
+            with ThreadPoolExecutor(max_workers=min(32, len(targets))) as pool:
+                latencies = pool.map(lambda t: measure_latency(t[1], t[2], timeout), targets)
+                for (name, _, _), latency in zip(targets, latencies):
+                    results[name] = latency
+        for name, latency in results.items():
+            record_probe(name, store.get(name).host, latency)
+        return results
+
+    def run_batch(self, lines: Iterable[str], atomic: bool = True) -> List[dict]:
+        """
+        在一个进程内执行JSON Lines格式的批量操作
+        所有操作共用一次配置读取和一个加密器，修改在内存中进行，最后统一写入一次；
+        connect和probe在配置写入后执行。atomic为True（默认）时任一行失败则不保存任何修改，
+        也不执行connect和probe；为False时只跳过失败的行
+        返回: 每一行的执行结果
+        """
+        config = self._load_config()
+        previous = self.password_hosts(config)
+        cipher = self._get_cipher()
+        results: List[dict] = []
+        touched = set()
+        connects, probes = [], []
+
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            result = {"line": lineno, "op": None, "name": None, "ok": True}
+            results.append(result)
+            try:
+                op = json.loads(line)
+                if not isinstance(op, dict):
+                    raise ValueError("每一行必须是JSON对象")
+                result["op"] = op.get("op")
+                result["name"] = op.get("name")
+                if result["op"] not in BATCH_OPS:
+                    raise ValueError(f"未知的操作：{result['op']}")
+                if result["op"] == "connect":
+                    connects.append((result, self._connect_options(op)))
+                elif result["op"] == "probe":
+                    probes.append(result)
+                else:
+                    touched.update(BATCH_OPS[result["op"]](self, config, cipher, op))
+            except KeyError as e:
+                result["ok"] = False
+                result["error"] = f"缺少字段：{e.args[0]}"
+            except Exception as e:
+                result["ok"] = False
+                result["error"] = str(e)
+
+        failed = any(not r["ok"] for r in results)
+        if atomic and failed:
+            for result in results:
+                if result["ok"]:
+                    result["ok"] = False
+                    result["error"] = "批量操作已回滚"
+            return results
+
+        if touched:
+            self._save_config(config)
+            for name in touched:
+                self.rdp_cache.invalidate(name)
+            self.forget_credentials(previous, config)
+
+        store = ConnectionStore.from_config(config)
+        # 性能配置和可达性检查相同的连接一起批量启动
+        groups: Dict[tuple, List[dict]] = {}
+        for result, options in connects:
+            groups.setdefault(options, []).append(result)
+        for (profile, check), group in groups.items():
+            errors = self.connect_many([r["name"] for r in group], profile, check, config=store)
+            for result in group:
+                error = errors[result["name"]]
+                result["ok"] = error is None
+                if error is not None:
+                    result["error"] = error
+        if probes:
+            latencies = self.probe([r["name"] for r in probes], config=store)
+            for result in probes:
+                latency = latencies.get(result["name"])
+                result["ok"] = latency is not None
+                result["latency_ms"] = latency
+                if latency is None:
+                    result["error"] = ("主机不可达或无法解析" if result["name"] in latencies
+                                       else self._missing(store, result["name"]))
+        return results
+
+    @staticmethod
+    def _connect_options(op: dict) -> tuple:
+        """批量connect的性能配置和可达性检查选项"""
+        profile = op.get("profile")
+        if profile is not None and profile not in PROFILE_NAMES:
+            raise ValueError(f"未知的性能配置：{profile}")
+        check = op.get("check", False)
+        if not isinstance(check, bool):
+            raise ValueError("check必须是true或false")
+        return profile, check
+
+    def _batch_add(self, config: dict, cipher: Fernet, op: dict) -> List[str]:
+        name = op["name"]
+        config[name] = self._make_connection(
+            cipher, name, op["host"], op.get("username", DEFAULT_USERNAME), op.get("password"),
+            op.get("port", DEFAULT_PORT), op.get("profile", DEFAULT_PROFILE),
+            tag_list(op, "tags"))
+        return [name]
+
+    def _batch_update(self, config: dict, cipher: Fernet, op: dict) -> List[str]:
+        name = op["name"]
+        if name not in config:
+            raise ValueError(f"未找到名为 {name} 的远程桌面配置")
+        current = config[name]
+        new_name = op.get("new_name", name)
+        if new_name != name and new_name in config:
+            raise ValueError(f"连接名称已存在：{new_name}")
+        updated = self._make_connection(
+            cipher,
+            new_name,
+            op.get("host", current["host"]),
+            op.get("username", current["username"]),
+            None,
+            op.get("port", current.get("port", DEFAULT_PORT)),
+            op.get("profile", current.get("profile", DEFAULT_PROFILE)),
+            tag_list(op, "tags") if "tags" in op else current.get("tags", ()))
+        if "password" in op:
+            updated["password"] = (cipher.encrypt(op["password"].encode()).decode()
+                                   if op["password"] else None)
+        else:
+            updated["password"] = current.get("password")
+        del config[name]
+        config[new_name] = updated
+        return [name, new_name]
+
+    def _batch_delete(self, config: dict, cipher: Fernet, op: dict) -> List[str]:
+        name = op["name"]
+        if name not in config:
+            raise ValueError(f"未找到名为 {name} 的远程桌面配置")
+        del config[name]
+        return [name]
+
+    def _batch_tag(self, config: dict, cipher: Fernet, op: dict) -> List[str]:
+        name = op["name"]
+        if name not in config:
+            raise ValueError(f"未找到名为 {name} 的远程桌面配置")
+        tags = set(config[name].get("tags", ()))
+        tags.update(tag_list(op, "add"))
+        tags.difference_update(tag_list(op, "remove"))
+        if tags:
+            config[name]["tags"] = sorted(tags)
+        else:
+            config[name].pop("tags", None)
+        return [name]
+
+    def select_connections(self, names: Optional[Iterable[str]] = None,
+                           tags: Iterable[str] = (), pattern: Optional[str] = None) -> Iterable[Connection]:
+        """按名称、标签（任一匹配）和名称通配符筛选连接"""
+        store = self.connections()
+        names = set(names) if names else None
+        tags = set(tags)
+        for connection in store:
+            if names is not None and connection.name not in names:
+                continue
+            if tags and not tags.intersection(connection.tags):
+                continue
+            if pattern and not fnmatch.fnmatchcase(connection.name, pattern):
+                continue
+            yield connection
+
+    def export_rdp(self, output, names: Optional[Iterable[str]] = None, tags: Iterable[str] = (),
+                   pattern: Optional[str] = None, profile: Optional[str] = None,
+                   workers: int = 8, as_zip: Optional[bool] = None) -> int:
+        """
+        批量导出筛选出的连接的.rdp文件到目录或zip
+        返回: 导出数量
+        """
+        return export_rdp_files(self.select_connections(names, tags, pattern),
+                                output, profile, workers, as_zip)
+
+    def sessions(self, names: Optional[Iterable[str]] = None, refresh: bool = False) -> Dict[str, tuple]:
+        """
+        并发查询连接主机上的远程会话
+        返回: 连接名称 -> (连接, 会话列表或查询异常)
+        """
+        store = self.connections()
+        names = store.names() if names is None else [n for n in names if n in store]
+        connections = [store.get(name) for name in names]
+        results = self.session_inventory.query_all((c.host for c in connections), refresh)
+        return {c.name: (c, results[c.host]) for c in connections}
+
+    def discover_ports(self, names: Optional[Iterable[str]] = None,
+                       candidates: Iterable[int] = DEFAULT_CANDIDATES,
+                       timeout: float = 2.0, write: bool = True) -> Dict[str, tuple]:
+        """
+        并发发现连接主机上实际的远程桌面端口，已保存的端口优先尝试；
+        write为True时将变化的端口一次性写回配置
+        返回: 连接名称 -> (原端口, 发现的端口或None)，无法解析的连接不包含在内
+        """
+        store = self.connections()
+        names = store.names() if names is None else [n for n in names if n in store]
+        candidates = tuple(candidates)
+        addresses = self.pre_resolve(store, names)
+        targets = {name: (address, candidate_ports(store.get(name).port, candidates))
+                   for name, address in addresses.items() if address is not None}
+        found = discover_ports(targets, timeout)
+
+        results = {}
+        changed = []
+        for name, port in found.items():
+            old_port = store.get(name).port
+            results[name] = (old_port, port)
+            if port is not None and port != old_port:
+                changed.append((name, port))
+        if write and changed:
+            # 只修改端口字段，其他字段（包括无效记录）原样写回
+            config = self._load_config()
+            for name, port in changed:
+                config[name]["port"] = port
+            self._save_config(config)
+            for name, _ in changed:
+                self.rdp_cache.invalidate(name)
+        return results
+
+    def get_rdp_status(self, force: bool = False) -> tuple[bool, int]:
         """
         获取远程桌面状态
+        force: 忽略缓存重新读取
         返回: (是否启用, 当前端口号)
         """
         try:
-            # 检查远程桌面服务状态
-            result = subprocess.run(['sc', 'query', 'TermService'], 
-                                 capture_output=True, text=True)
-            service_running = "RUNNING" in result.stdout
-
-            # 检查远程桌面设置
-            reg_path = r"System\CurrentControlSet\Control\Terminal Server"
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path, 0, 
-                              winreg.KEY_READ) as key:
-                rdp_enabled = not bool(winreg.QueryValueEx(key, "fDenyTSConnections")[0])
-
-            # 获取当前端口
-            reg_path = r"SYSTEM\CurrentControlSet\Control\Terminal Server\WinStations\RDP-Tcp"
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path, 0, 
-                              winreg.KEY_READ) as key:
-                current_port = int(winreg.QueryValueEx(key, "PortNumber")[0])
-
-            return (service_running and rdp_enabled, current_port)
+            # 一次读取注册表和服务状态，TTL内直接使用缓存
+            snapshot = self.state.snapshot(force=force)
+            rdp_enabled = not snapshot.deny_connections
+            return (snapshot.service_running and rdp_enabled, snapshot.port)
         except Exception:
             return (False, DEFAULT_PORT)
 
+# 批量操作名称 -> 处理方法；connect和probe在配置写入后统一执行
+BATCH_OPS = {
+    "add": RDPManager._batch_add,
+    "update": RDPManager._batch_update,
+    "delete": RDPManager._batch_delete,
+    "tag": RDPManager._batch_tag,
+    "connect": None,
+    "probe": None,
+}
+
 @click.group()
-def cli():
+@click.option('--profile', 'profile_mode', type=click.Choice(PROFILE_MODES),
+              help='对本次命令进行性能分析，结果保存到 ~/.rdp_manager/profiles')
+@click.pass_context
+def cli(ctx, profile_mode):
     """Windows远程桌面批量管理工具"""
-    pass
+    ctx.call_on_close(save_metrics)
+    if profile_mode:
+        profiler = Profiler(ctx.invoked_subcommand, profile_mode)
+        profiler.start()
+        # 写到标准错误，不混入batch --json、export-rdp -等命令的标准输出
+        ctx.call_on_close(lambda: Console(stderr=True).print(
+            f"[cyan]性能分析已保存：{profiler.stop()}[/cyan]", soft_wrap=True))
 
 @cli.command()
 @click.option('--port', '-p', default=DEFAULT_PORT, help='远程桌面端口号')
@@ -428,9 +859,11 @@ def set_port(port):
 @click.option('--username', '-u', default=DEFAULT_USERNAME, help='用户名')
 @click.option('--password', '-p', help='密码（可选）')
 @click.option('--port', '-P', default=DEFAULT_PORT, help='端口号')
-def add(name, host, username, password, port):
+@click.option('--profile', type=click.Choice(PROFILE_NAMES), default=DEFAULT_PROFILE,
+              help='性能配置（auto按延迟自动选择）')
+def add(name, host, username, password, port, profile):
     """添加远程桌面连接配置"""
-    RDPManager().add_connection(name, host, username, password, port)
+    RDPManager().add_connection(name, host, username, password, port, profile)
 
 @cli.command()
 def list():
@@ -438,10 +871,289 @@ def list():
     RDPManager().list_connections()
 
 @cli.command()
-@click.argument('name')
-def connect(name):
-    """连接到指定的远程桌面"""
-    RDPManager().connect(name)
+@click.argument('names', nargs=-1, required=True)
+@click.option('--profile', type=click.Choice(PROFILE_NAMES), help='临时指定性能配置')
+@click.option('--check', is_flag=True, help='启动前检查主机是否可达')
+def connect(names, profile, check):
+    """连接到指定的远程桌面（可指定多个名称批量连接）"""
+    manager = RDPManager()
+    if len(names) == 1:
+        manager.connect(names[0], profile, check)
+    else:
+        manager.connect_many(names, profile, check)
+
+@cli.command('sync-credentials')
+@click.argument('names', nargs=-1)
+@click.option('--force', is_flag=True, help='忽略台账，重新写入所有凭据')
+def sync_credentials(names, force):
+    """将保存的密码同步到系统凭据管理器（默认全部连接）"""
+    results = RDPManager().sync_credentials(names or None, force)
+    written = sum(1 for status in results.values() if status == "written")
+    unchanged = sum(1 for status in results.values() if status == "unchanged")
+    conflicted = sum(1 for status in results.values() if status == CONFLICT)
+    failed = len(results) - written - unchanged - conflicted
+    console.print(f"[green]已写入 {written} 个凭据[/green]，未变化 {unchanged} 个，"
+                  f"账户冲突 {conflicted} 个，失败 {failed} 个")
+
+@cli.command()
+@click.argument('names', nargs=-1)
+@click.option('--timeout', default=2.0, help='单个主机的超时时间（秒）')
+def probe(names, timeout):
+    """并发探测连接的可达性（默认全部连接）"""
+    manager = RDPManager()
+    store = manager.connections()
+    results = manager.probe(names or None, timeout, config=store)
+    if not results:
+        console.print("[yellow]没有可探测的远程桌面配置[/yellow]")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("名称")
+    table.add_column("主机地址")
+    table.add_column("端口")
+    table.add_column("延迟（毫秒）")
+    for name, latency in results.items():
+        connection = store.get(name)
+        table.add_row(
+            name,
+            connection.host,
+            str(connection.port),
+            "[red]不可达[/red]" if latency is None else f"{latency:.1f}"
+        )
+    console.print(table)
+
+@cli.command()
+@click.argument('file', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--atomic/--no-atomic', default=True, show_default=True,
+              help='任一行失败时不保存任何修改，也不执行connect和probe；'
+                   '--no-atomic时跳过失败的行，保存其余修改')
+@click.option('--json', 'as_json', is_flag=True, help='以JSON Lines输出每一行的结果')
+def batch(file, atomic, as_json):
+    """
+    执行JSON Lines格式的批量操作（add/update/delete/tag/connect/probe），FILE默认为标准输入
+
+    \b
+    每行一个JSON对象，例如：
+      {"op": "add", "name": "web", "host": "10.0.0.5", "tags": ["prod"]}
+      {"op": "tag", "name": "web", "add": ["web"], "remove": ["old"]}
+      {"op": "connect", "name": "web", "profile": "lan", "check": true}
+    """
+    if as_json:
+        with messages_to_stderr():
+            results = RDPManager().run_batch(file, atomic)
+        for result in results:
+            click.echo(json.dumps(result, ensure_ascii=False))
+    else:
+        results = RDPManager().run_batch(file, atomic)
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("行")
+        table.add_column("操作")
+        table.add_column("名称")
+        table.add_column("结果")
+        for result in results:
+            table.add_row(
+                str(result["line"]),
+                str(result["op"]),
+                str(result["name"]),
+                "[green]成功[/green]" if result["ok"] else f"[red]{result.get('error', '失败')}[/red]"
+            )
+        console.print(table)
+    failed = sum(1 for r in results if not r["ok"])
+    if not as_json:
+        console.print(f"共 {len(results)} 行，成功 {len(results) - failed}，失败 {failed}")
+    if failed:
+        sys.exit(1)
+
+@cli.command('export-rdp')
+@click.argument('output')
+@click.argument('names', nargs=-1)
+@click.option('--tag', '-t', 'tags', multiple=True, help='只导出带有该标签的连接（可多次指定）')
+@click.option('--match', '-m', 'pattern', help='按名称通配符筛选，例如 "web-*"')
+@click.option('--profile', type=click.Choice(PROFILE_NAMES), help='统一使用的性能配置')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=8, help='渲染线程数')
+@click.option('--zip', 'as_zip', is_flag=True, default=None, help='写入zip（OUTPUT以.zip结尾时自动启用）')
+def export_rdp(output, names, tags, pattern, profile, workers, as_zip):
+    """批量导出.rdp文件到目录或zip，OUTPUT为 - 时将zip写到标准输出"""
+    manager = RDPManager()
+    if output == '-':
+        with messages_to_stderr():
+            manager.export_rdp(sys.stdout.buffer, names, tags, pattern, profile, workers)
+        return
+    count = manager.export_rdp(output, names, tags, pattern, profile, workers, as_zip)
+    console.print(f"[green]已导出 {count} 个RDP文件到 {output}[/green]")
+
+@cli.command()
+@click.argument('names', nargs=-1)
+@click.option('--mine', is_flag=True, help='只显示连接用户名自己的会话')
+def sessions(names, mine):
+    """并发查询连接主机上的活动和已断开会话（默认全部连接）"""
+    results = RDPManager().sessions(names or None, refresh=True)
+    if not results:
+        console.print("[yellow]没有可查询的远程桌面配置[/yellow]")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("名称")
+    table.add_column("主机地址")
+    table.add_column("会话ID")
+    table.add_column("用户")
+    table.add_column("状态")
+    for name, (connection, result) in results.items():
+        if isinstance(result, Exception):
+            table.add_row(name, connection.host, "-", "-", f"[red]查询失败：{result}[/red]")
+            continue
+        for session in result:
+            own = same_user(session.username, connection.username)
+            if mine and not own:
+                continue
+            state = "活动" if session.state == "Active" else "已断开"
+            table.add_row(
+                name,
+                connection.host,
+                str(session.session_id),
+                f"[bold]{session.username}[/bold]" if own else session.username,
+                state
+            )
+    console.print(table)
+
+@cli.command()
+@click.option('--top', '-t', default=10, help='显示最常用的连接数量')
+def stats(top):
+    """显示连接启动耗时和使用统计"""
+    history = RDPManager().history
+    host_stats = history.host_stats()
+    if not host_stats:
+        console.print("[yellow]暂无连接历史[/yellow]")
+        return
+
+    fmt = lambda ms: "-" if ms is None else f"{ms:.1f}"
+    table = Table(title="启动耗时（毫秒）", show_header=True, header_style="bold magenta")
+    table.add_column("主机地址")
+    table.add_column("次数")
+    table.add_column("p50")
+    table.add_column("p95")
+    table.add_column("失败率")
+    for item in host_stats:
+        table.add_row(item["host"], str(item["count"]), fmt(item["p50"]),
+                      fmt(item["p95"]), f"{item['failure_rate']:.0%}")
+    console.print(table)
+
+    summary = history.summary()
+    table = Table(title="最常用连接", show_header=True, header_style="bold magenta")
+    table.add_column("名称")
+    table.add_column("次数")
+    table.add_column("最近使用")
+    for name in history.order(summary, 'frequency')[:top]:
+        entry = summary[name]
+        last_used = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry["last_used"]))
+        table.add_row(name, str(entry["count"]), last_used)
+    console.print(table)
+
+@cli.group()
+def cache():
+    """管理RDP文件缓存"""
+    pass
+
+@cache.command('stats')
+def cache_stats():
+    """显示RDP文件缓存统计"""
+    stats = RDPManager().rdp_cache.stats()
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("项目")
+    table.add_column("值")
+    table.add_row("缓存文件数", f"{stats['entries']} / {stats['max_entries']}")
+    table.add_row("占用空间", f"{stats['bytes']} / {stats['max_bytes']} 字节")
+    table.add_row("已缓存连接数", str(stats['connections']))
+    console.print(table)
+
+@cache.command('clear')
+def cache_clear():
+    """清空RDP文件缓存"""
+    removed = RDPManager().rdp_cache.clear()
+    console.print(f"[green]已清除 {removed} 个缓存文件[/green]")
+
+@cli.command()
+@click.argument('names', nargs=-1)
+@click.option('--textfile', type=click.Path(dir_okay=False), envvar=METRICS_TEXTFILE_ENV,
+              help=f'写入textfile collector文件，--serve时每次探测后更新（默认取环境变量 {METRICS_TEXTFILE_ENV}）')
+@click.option('--serve', is_flag=True, help='启动HTTP指标端点并定期探测，按Ctrl+C停止')
+@click.option('--port', '-p', default=DEFAULT_METRICS_PORT, help='HTTP指标端点端口')
+@click.option('--interval', '-i', default=60.0, help='定期探测的间隔（秒）')
+@click.option('--timeout', default=2.0, help='探测超时（秒）')
+def metrics(names, textfile, serve, port, interval, timeout):
+    """探测连接并导出Prometheus格式的运行指标（默认输出到标准输出）"""
+    manager = RDPManager()
+    if textfile or serve:
+        manager.probe(names or None, timeout)
+    else:
+        # 标准输出只保留指标文本
+        with messages_to_stderr():
+            manager.probe(names or None, timeout)
+    # 输出包括之前各次命令累加的操作耗时、失败次数等指标
+    state = registry.persist(manager.metrics_file)
+    if textfile:
+        registry.write_textfile(Path(textfile), state)
+        console.print(f"[green]指标已写入：{textfile}[/green]", soft_wrap=True)
+    if not serve:
+        if not textfile:
+            click.echo(registry.render(state), nl=False)
+        return
+
+    server = MetricsServer(
+        port, render=lambda: registry.render(registry.persist(manager.metrics_file)))
+    server.start()
+    console.print(f"[green]指标端点：http://127.0.0.1:{port}/metrics（按Ctrl+C停止）[/green]")
+    try:
+        while True:
+            time.sleep(interval)
+            manager.probe(names or None, timeout)
+            state = registry.persist(manager.metrics_file)
+            if textfile:
+                registry.write_textfile(Path(textfile), state)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+@cli.command('discover-port')
+@click.argument('names', nargs=-1)
+@click.option('--ports', '-p', default=','.join(map(str, DEFAULT_CANDIDATES)), show_default=True,
+              help='候选端口，可用逗号分隔和范围，例如 3389,3390-3399')
+@click.option('--timeout', default=2.0, help='每个端口的探测超时（秒）')
+@click.option('--dry-run', is_flag=True, help='只显示结果，不写回配置')
+def discover_port(names, ports, timeout, dry_run):
+    """并发探测连接主机上实际的远程桌面端口并写回配置（默认全部连接）"""
+    try:
+        candidates = parse_ports(ports)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--ports')
+    manager = RDPManager()
+    store = manager.connections()
+    results = manager.discover_ports(names or None, candidates, timeout, write=not dry_run)
+    if not results:
+        console.print("[yellow]没有可探测的远程桌面配置[/yellow]")
+        return
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("名称")
+    table.add_column("主机地址")
+    table.add_column("原端口")
+    table.add_column("发现端口")
+    table.add_column("结果")
+    updated = 0
+    for name, (old_port, port) in results.items():
+        if port is None:
+            status = "[red]未发现远程桌面服务[/red]"
+        elif port == old_port:
+            status = "[green]未变化[/green]"
+        else:
+            updated += 1
+            status = "[yellow]待更新[/yellow]" if dry_run else "[cyan]已更新[/cyan]"
+        table.add_row(name, store.get(name).host, str(old_port),
+                      "-" if port is None else str(port), status)
+    console.print(table)
+    if updated and not dry_run:
+        console.print(f"[green]已更新 {updated} 个连接的端口[/green]")
 
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
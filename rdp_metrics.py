@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+运行指标
+以Prometheus文本格式导出探测结果、操作耗时、子进程数量和缓存命中率，
+可写入textfile collector文件，或通过本地HTTP端点提供；
+每个进程的指标累加到状态文件，CLI每次操作后的数据都不会丢失
+"""
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_METRICS_PORT = 9860
+METRICS_TEXTFILE_ENV = "RDPM_METRICS_TEXTFILE"
+METRICS_STATE_FILE = "metrics.json"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    tmp.write_text(text, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> Dict[str, object]:
+        """当前取值，键为JSON编码的标签值"""
+        with self._lock:
+            return {json.dumps(key): self._export(value) for key, value in self._values.items()}
+
+    def _export(self, value):
+        return value
+
+    @abstractmethod
+    def accumulate(self, stored, value, base):
+        """把本进程自base以来的变化合并到已保存的值stored，返回None表示删除"""
+
+    @abstractmethod
+    def _samples(self, values: Dict[Tuple[str, ...], object]) -> List[str]:
+        """生成样本行"""
+
+    def render(self, values: Optional[Dict[str, object]] = None) -> str:
+        """values为snapshot格式的取值，默认使用本进程的取值"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            with self._lock:
+                lines.extend(self._samples(self._values))
+        else:
+            lines.extend(self._samples({tuple(json.loads(k)): v for k, v in values.items()}))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def accumulate(self, stored, value, base):
+        return (stored or 0) + value - (base or 0)
+
+    def _samples(self, values: Dict[Tuple[str, ...], object]) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in sorted(values.items()) if v is not None]
+
+
+class Gauge(Counter):
+    """可任意设置的数值"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels) -> None:
+        # 保留None作为删除标记，持久化时同时删除状态文件中的旧值
+        key = self._key(labels)
+        with self._lock:
+            if key in self._values:
+                self._values[key] = None
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels)) or 0
+
+    def accumulate(self, stored, value, base):
+        # 本进程没有改动过的取值不覆盖其他进程写入的新值
+        if value is None:
+            return None
+        return stored if value == base else value
+
+
+class Histogram(_Metric):
+    """耗时分布"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def _export(self, value):
+        counts, total = value
+        return [list(counts), total]
+
+    def accumulate(self, stored, value, base):
+        counts, total = value
+        if base is not None:
+            counts = [c - b for c, b in zip(counts, base[0])]
+            total -= base[1]
+        if stored is None or len(stored[0]) != len(counts):  # 分桶定义变化时丢弃旧数据
+            return [counts, total]
+        return [[s + c for s, c in zip(stored[0], counts)], stored[1] + total]
+
+    def _samples(self, values: Dict[Tuple[str, ...], object]) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._baseline: Dict[str, Dict[str, object]] = {}
+        self._persist_lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, state: Optional[Dict[str, Dict[str, object]]] = None) -> str:
+        """生成Prometheus文本格式，state为persist返回的累加状态，默认只输出本进程的取值"""
+        return "\n".join(m.render(None if state is None else state.get(m.name, {}))
+                         for m in self._metrics.values()) + "\n"
+
+    def write_textfile(self, path: Path,
+                       state: Optional[Dict[str, Dict[str, object]]] = None) -> None:
+        """原子写入textfile collector文件"""
+        _write_atomic(Path(path), self.render(state))
+
+    def persist(self, path: Path) -> Dict[str, Dict[str, object]]:
+        """
+        把本进程自上次持久化以来的变化累加到状态文件，返回累加后的全部状态
+        计数器和直方图跨进程累加，仪表保留最后写入的值
+        """
+        path = Path(path)
+        with self._persist_lock:
+            current = {name: metric.snapshot() for name, metric in self._metrics.items()}
+            try:
+                state = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                state = {}
+            for name, values in current.items():
+                metric = self._metrics[name]
+                base = self._baseline.get(name, {})
+                stored = state.setdefault(name, {})
+                for key, value in values.items():
+                    merged = metric.accumulate(stored.get(key), value, base.get(key))
+                    if merged is None:
+                        stored.pop(key, None)
+                    else:
+                        stored[key] = merged
+            _write_atomic(path, json.dumps(state))
+            self._baseline = current
+            return state
+
+
+registry = MetricsRegistry()
+
+HOST_UP = registry.gauge(
+    "rdpm_host_up", "连接主机是否可达（1可达，0不可达）", ("name", "host"))
+HOST_LATENCY = registry.gauge(
+    "rdpm_host_latency_seconds", "最近一次探测的TCP建连耗时", ("name", "host"))
+OPERATION_DURATION = registry.histogram(
+    "rdpm_operation_duration_seconds", "管理操作耗时", ("operation",))
+OPERATION_FAILURES = registry.counter(
+    "rdpm_operation_failures_total", "管理操作失败次数", ("operation",))
+SUBPROCESS_TOTAL = registry.counter(
+    "rdpm_subprocess_total", "启动的子进程数量", ("command",))
+CACHE_REQUESTS = registry.counter(
+    "rdpm_cache_requests_total", "缓存访问次数", ("cache", "result"))
+GUI_STALL_DURATION = registry.histogram(
+    "rdpm_gui_stall_seconds", "界面主线程卡顿时长",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+
+@contextmanager
+def timed_operation(operation: str):
+    """记录管理操作的耗时和失败次数"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        OPERATION_FAILURES.inc(operation=operation)
+        raise
+    finally:
+        OPERATION_DURATION.observe(time.perf_counter() - start, operation=operation)
+
+
+def cache_access(cache: str, hit: bool) -> None:
+    """记录一次缓存访问"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_probe(name: str, host: str, latency_ms: Optional[float]) -> None:
+    """记录一次可达性探测结果"""
+    HOST_UP.set(0 if latency_ms is None else 1, name=name, host=host)
+    if latency_ms is None:
+        HOST_LATENCY.remove(name=name, host=host)
+    else:
+        HOST_LATENCY.set(latency_ms / 1000, name=name, host=host)
+
+
+class MetricsServer:
+    """本地HTTP指标端点，可随时启动和停止"""
+
+    def __init__(self, port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1",
+                 render: Callable[[], str] = registry.render):
+        """render: 每次抓取时调用，返回指标文本"""
+        self.address = (host, port)
+        self.render = render
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> None:
+        if self._server is not None:
+            return
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(self.address, Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="rdpm-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = self._thread = None
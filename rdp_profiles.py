@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+远程桌面性能配置
+按网络条件预设颜色深度、分辨率、连接类型、视觉效果和音频等参数
+"""
+
+import socket
+import time
+from string import Template
+from typing import Dict, Optional
+
+DEFAULT_PORT = 3389
+AUTO_PROFILE = "auto"
+DEFAULT_PROFILE = "lan"
+
+# 连接类型（connection type）取值：1=调制解调器 2=低速宽带 3=卫星 4=高速宽带 5=WAN 6=LAN 7=自动检测
+# 开启网络/带宽自动检测时mstsc会忽略指定的连接类型，因此固定配置都关闭自动检测
+PERFORMANCE_PROFILES: Dict[str, Dict[str, int]] = {
+    "lan": {
+        "desktopwidth": 1920,
+        "desktopheight": 1080,
+        "session_bpp": 32,
+        "connection_type": 6,
+        "bitmap_cache": 1,
+        "disable_wallpaper": 0,
+        "disable_themes": 0,
+        "font_smoothing": 1,
+        "desktop_composition": 1,
+        "audiomode": 0,
+        "videoplaybackmode": 1,
+        "network_autodetect": 0,
+        "bandwidth_autodetect": 0,
+    },
+    "broadband": {
+        "desktopwidth": 1600,
+        "desktopheight": 900,
+        "session_bpp": 24,
+        "connection_type": 4,
+        "bitmap_cache": 1,
+        "disable_wallpaper": 1,
+        "disable_themes": 0,
+        "font_smoothing": 1,
+        "desktop_composition": 0,
+        "audiomode": 0,
+        "videoplaybackmode": 1,
+        "network_autodetect": 0,
+        "bandwidth_autodetect": 0,
+    },
+    "low": {
+        "desktopwidth": 1280,
+        "desktopheight": 720,
+        "session_bpp": 16,
+        "connection_type": 3,
+        "bitmap_cache": 1,
+        "disable_wallpaper": 1,
+        "disable_themes": 1,
+        "font_smoothing": 0,
+        "desktop_composition": 0,
+        "audiomode": 2,
+        "videoplaybackmode": 0,
+        "network_autodetect": 0,
+        "bandwidth_autodetect": 0,
+    },
+}
+
+PROFILE_NAMES = tuple(PERFORMANCE_PROFILES) + (AUTO_PROFILE,)
+
+# 自动模式下的延迟阈值（毫秒）：(上限, 配置名)
+AUTO_THRESHOLDS = ((10.0, "lan"), (80.0, "broadband"))
+AUTO_FALLBACK = "broadband"
+
+# 预编译的RDP文件模板
+RDP_TEMPLATE = Template("""\
+screen mode id:i:2
+use multimon:i:0
+desktopwidth:i:$desktopwidth
+desktopheight:i:$desktopheight
+session bpp:i:$session_bpp
+winposstr:s:0,1,0,0,800,600
+compression:i:1
+keyboardhook:i:2
+audiocapturemode:i:0
+audiomode:i:$audiomode
+videoplaybackmode:i:$videoplaybackmode
+connection type:i:$connection_type
+networkautodetect:i:$network_autodetect
+bandwidthautodetect:i:$bandwidth_autodetect
+bitmapcachepersistenable:i:$bitmap_cache
+disable wallpaper:i:$disable_wallpaper
+disable themes:i:$disable_themes
+allow font smoothing:i:$font_smoothing
+allow desktop composition:i:$desktop_composition
+displayconnectionbar:i:1
+username:s:$username
+full address:s:$host:$port
+prompt for credentials:i:$prompt
+""")
+
+
+def measure_latency(host: str, port: int = DEFAULT_PORT, timeout: float = 2.0) -> Optional[float]:
+    """测量TCP建连耗时（毫秒），不可达时返回None"""
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return (time.perf_counter() - start) * 1000
+    except OSError:
+        return None
+
+
+def choose_profile(latency_ms: Optional[float]) -> str:
+    """根据延迟选择性能配置"""
+    if latency_ms is None:
+        return AUTO_FALLBACK
+    for limit, profile in AUTO_THRESHOLDS:
+        if latency_ms < limit:
+            return profile
+    return "low"
+
+
+def resolve_profile(connection: dict, profile: Optional[str] = None,
+                    address: Optional[str] = None) -> str:
+    """
+    确定连接实际使用的性能配置，auto模式下测量延迟
+    address: 已预解析的主机地址，避免重复DNS查询
+    """
+    profile = profile or connection.get("profile") or DEFAULT_PROFILE
+    if profile == AUTO_PROFILE:
+        latency = measure_latency(address or connection["host"],
+                                  connection.get("port", DEFAULT_PORT))
+        return choose_profile(latency)
+    if profile not in PERFORMANCE_PROFILES:
+        raise ValueError(f"未知的性能配置：{profile}")
+    return profile
+
+
+def render_rdp(connection: dict, profile: str) -> str:
+    """使用指定性能配置渲染RDP文件内容"""
+    return RDP_TEMPLATE.substitute(
+        PERFORMANCE_PROFILES[profile],
+        username=connection["username"],
+        host=connection["host"],
+        port=connection.get("port", DEFAULT_PORT),
+        prompt="1" if not connection.get("password") else "0",
+    )
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+性能分析
+为命令行命令和图形界面操作生成 cProfile（.pstats）或采样（.folded，火焰图格式）分析文件
+"""
+
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+PROFILE_MODES = ("cprofile", "sampling")
+PROFILE_ENV = "RDPM_PROFILE"
+PROFILE_DIR = Path.home() / '.rdp_manager' / 'profiles'
+DEFAULT_INTERVAL = 0.005
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+    后台线程定期抓取目标线程的调用栈，按折叠栈格式（flamegraph.pl / speedscope）统计
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = DEFAULT_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def enable(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rdpm-sampler", daemon=True)
+        self._thread.start()
+
+    def disable(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump_stats(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """对一段代码进行性能分析，结束时写入分析文件"""
+
+    def __init__(self, label: str, mode: str = "cprofile", output_dir: Path = PROFILE_DIR):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知的分析方式：{mode}")
+        self.label = re.sub(r'[^\w.-]+', '_', label or 'run')
+        self.mode = mode
+        self.output_dir = Path(output_dir)
+        self.path: Optional[Path] = None
+        if mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+        else:
+            self._profiler = SamplingProfiler()
+
+    def start(self) -> None:
+        self._profiler.enable()
+
+    def stop(self) -> Path:
+        """停止分析并写入文件，返回文件路径"""
+        self._profiler.disable()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        suffix = '.pstats' if self.mode == "cprofile" else '.folded'
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        self.path = self.output_dir / f"{self.label}-{stamp}-{os.getpid()}{suffix}"
+        self._profiler.dump_stats(self.path)
+        return self.path
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def profiled_slot(label: str):
+    """
+    图形界面槽函数的性能分析装饰器
+    实例的 profile_mode 为 cprofile/sampling 时分析本次调用，并调用 on_profile_written(路径)；
+    被装饰的槽函数不接收信号参数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            mode = getattr(self, 'profile_mode', None)
+            # 嵌套调用时由外层的分析覆盖
+            if not mode or getattr(self, '_profiling', False):
+                return func(self)
+            profiler = Profiler(label, mode)
+            self._profiling = True
+            profiler.start()
+            try:
+                return func(self)
+            finally:
+                path = profiler.stop()
+                self._profiling = False
+                callback = getattr(self, 'on_profile_written', None)
+                if callback:
+                    callback(path)
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+远程桌面注册表与状态访问层
+一次性读取所有远程桌面相关的注册表值，并按短TTL缓存
+"""
+
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from rdp_metrics import cache_access
+
+try:
+    import winreg
+except ImportError:  # 非Windows平台（例如在Linux上运行测试）
+    winreg = None
+
+TS_KEY = r"SYSTEM\CurrentControlSet\Control\Terminal Server"
+RDP_TCP_KEY = r"SYSTEM\CurrentControlSet\Control\Terminal Server\WinStations\RDP-Tcp"
+
+# 状态相关的注册表值：值名称 -> 所在键路径
+RDP_VALUES: Dict[str, str] = {
+    "fDenyTSConnections": TS_KEY,
+    "UserAuthentication": RDP_TCP_KEY,
+    "PortNumber": RDP_TCP_KEY,
+}
+
+DEFAULT_PORT = 3389
+DEFAULT_TTL = 2.0
+
+
+class RDPSnapshot(NamedTuple):
+    """某一时刻的远程桌面状态快照"""
+    deny_connections: bool
+    user_authentication: bool
+    port: int
+    service_running: bool
+    read_at: float
+
+
+class WinRegistry:
+    """基于winreg的注册表后端"""
+
+    def read_values(self, names: Dict[str, str]) -> Dict[str, Optional[int]]:
+        """按键路径分组读取，每个键只打开一次"""
+        by_key: Dict[str, list] = {}
+        for name, path in names.items():
+            by_key.setdefault(path, []).append(name)
+
+        values: Dict[str, Optional[int]] = {name: None for name in names}
+        for path, key_names in by_key.items():
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path, 0,
+                                    winreg.KEY_READ) as key:
+                    for name in key_names:
+                        try:
+                            values[name] = int(winreg.QueryValueEx(key, name)[0])
+                        except FileNotFoundError:
+                            pass
+            except FileNotFoundError:
+                pass
+        return values
+
+    def set_value(self, path: str, name: str, value: int) -> None:
+        """写入DWORD值"""
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path, 0,
+                            winreg.KEY_ALL_ACCESS) as key:
+            winreg.SetValueEx(key, name, 0, winreg.REG_DWORD, value)
+
+
+class FakeRegistry:
+    """内存中的注册表后端，用于非Windows平台测试"""
+
+    def __init__(self, values: Optional[Dict[Tuple[str, str], int]] = None):
+        self.values: Dict[Tuple[str, str], int] = dict(values or {})
+        self.read_count = 0
+        self.write_count = 0
+
+    def read_values(self, names: Dict[str, str]) -> Dict[str, Optional[int]]:
+        self.read_count += 1
+        return {name: self.values.get((path, name)) for name, path in names.items()}
+
+    def set_value(self, path: str, name: str, value: int) -> None:
+        self.write_count += 1
+        self.values[(path, name)] = value
+
+
+class RDPState:
+    """
+    远程桌面状态访问器
+    一次读取全部相关值（注册表 + 服务状态），在TTL内直接返回缓存；
+    通过本对象写入注册表时自动使缓存失效
+    """
+
+    def __init__(self, registry=None, service_probe: Optional[Callable[[], bool]] = None,
+                 ttl: float = DEFAULT_TTL):
+        self.registry = registry if registry is not None else WinRegistry()
+        self.service_probe = service_probe or (lambda: False)
+        self.ttl = ttl
+        self._snapshot: Optional[RDPSnapshot] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, force: bool = False) -> RDPSnapshot:
+        """获取状态快照，缓存未过期时不访问注册表和服务"""
+        with self._lock:
+            now = time.monotonic()
+            if (not force and self._snapshot is not None
+                    and now - self._snapshot.read_at < self.ttl):
+                cache_access("registry", True)
+                return self._snapshot
+            cache_access("registry", False)
+
+            values = self.registry.read_values(RDP_VALUES)
+            deny = values["fDenyTSConnections"]
+            port = values["PortNumber"]
+            self._snapshot = RDPSnapshot(
+                deny_connections=True if deny is None else bool(deny),
+                user_authentication=bool(values["UserAuthentication"]),
+                port=DEFAULT_PORT if port is None else port,
+                service_running=self.service_probe(),
+                read_at=now,
+            )
+            return self._snapshot
+
+    def set_value(self, name: str, value: int) -> None:
+        """写入远程桌面相关的注册表值并使缓存失效"""
+        try:
+            self.registry.set_value(RDP_VALUES[name], name, value)
+        finally:
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """使缓存失效，下次读取时重新查询"""
+        with self._lock:
+            self._snapshot = None
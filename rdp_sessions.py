@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+远程会话清单
+并发查询多台主机上的活动和已断开的远程桌面会话，结果按TTL缓存
+"""
+
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from rdp_metrics import SUBPROCESS_TOTAL
+
+try:
+    import win32ts
+except ImportError:  # 未安装pywin32或非Windows平台
+    win32ts = None
+
+CREATE_NO_WINDOW = 0x08000000
+DEFAULT_WORKERS = 16
+DEFAULT_TTL = 30.0
+
+ACTIVE = "Active"
+DISCONNECTED = "Disc"
+
+# qwinsta 输出中的状态（含中文系统）
+_STATE_NAMES = {
+    "active": ACTIVE, "运行中": ACTIVE, "活动": ACTIVE,
+    "disc": DISCONNECTED, "断开": DISCONNECTED, "已断开": DISCONNECTED,
+}
+_QWINSTA_LINE = re.compile(r'^[ >]?(?P<station>\S*)\s+(?P<user>\S*)\s+(?P<id>\d+)\s+(?P<state>\S+)')
+
+
+class Session(NamedTuple):
+    """远程主机上的一个会话"""
+    session_id: int
+    username: str
+    state: str
+    station: str = ""
+
+
+def parse_qwinsta(output: str) -> List[Session]:
+    """解析 qwinsta 的输出，只保留有用户的活动或已断开会话"""
+    sessions = []
+    for line in output.splitlines()[1:]:
+        match = _QWINSTA_LINE.match(line)
+        if not match or not match.group('user'):
+            continue
+        state = _STATE_NAMES.get(match.group('state').lower())
+        if state is None:
+            continue
+        sessions.append(Session(int(match.group('id')), match.group('user'), state,
+                                match.group('station')))
+    return sessions
+
+
+class QwinstaBackend:
+    """通过 qwinsta /server: 查询会话"""
+
+    def __init__(self, timeout: float = 15.0):
+        self.timeout = timeout
+
+    def query(self, host: str) -> List[Session]:
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+        SUBPROCESS_TOTAL.inc(command='qwinsta')
+        result = subprocess.run(['qwinsta', f'/server:{host}'], capture_output=True, text=True,
+                                timeout=self.timeout, creationflags=CREATE_NO_WINDOW,
+                                startupinfo=startupinfo)
+        if result.returncode != 0 and not result.stdout:
+            raise RuntimeError((result.stderr or "qwinsta 执行失败").strip())
+        return parse_qwinsta(result.stdout)
+
+
+class WTSBackend:
+    """通过 WTS API 查询会话，不需要启动子进程"""
+
+    def query(self, host: str) -> List[Session]:
+        states = {win32ts.WTSActive: ACTIVE, win32ts.WTSDisconnected: DISCONNECTED}
+        server = win32ts.WTSOpenServer(host)
+        try:
+            sessions = []
+            for info in win32ts.WTSEnumerateSessions(server, 1, 0):
+                state = states.get(info['State'])
+                if state is None:
+                    continue
+                username = win32ts.WTSQuerySessionInformation(
+                    server, info['SessionId'], win32ts.WTSUserName)
+                if username:
+                    sessions.append(Session(info['SessionId'], username, state,
+                                            info['WinStationName']))
+            return sessions
+        finally:
+            win32ts.WTSCloseServer(server)
+
+
+class FakeSessionBackend:
+    """内存中的会话数据，用于非Windows平台测试"""
+
+    def __init__(self, sessions: Optional[Dict[str, List[Session]]] = None):
+        self.sessions = dict(sessions or {})
+        self.query_count = 0
+
+    def query(self, host: str) -> List[Session]:
+        self.query_count += 1
+        if host not in self.sessions:
+            raise ConnectionError(f"无法连接到 {host}")
+        return list(self.sessions[host])
+
+
+def default_backend():
+    """选择当前平台可用的会话查询后端"""
+    if win32ts is not None:
+        return WTSBackend()
+    if sys.platform == 'win32':
+        return QwinstaBackend()
+    return FakeSessionBackend()
+
+
+SessionResult = Union[List[Session], Exception]
+
+
+class SessionInventory:
+    """并发查询多台主机的会话，结果（包括失败）按TTL缓存"""
+
+    def __init__(self, backend=None, workers: int = DEFAULT_WORKERS, ttl: float = DEFAULT_TTL):
+        self.backend = backend if backend is not None else default_backend()
+        self.workers = workers
+        self.ttl = ttl
+        self._cache: Dict[str, Tuple[SessionResult, float]] = {}
+        self._lock = threading.Lock()
+
+    def _query(self, host: str) -> SessionResult:
+        try:
+            return self.backend.query(host)
+        except Exception as e:
+            return e
+
+    def query_all(self, hosts: Iterable[str], refresh: bool = False) -> Dict[str, SessionResult]:
+        """
+        查询所有主机的会话
+        返回: 主机 -> 会话列表，查询失败时为异常对象
+        """
+        now = time.monotonic()
+        results: Dict[str, SessionResult] = {}
+        pending = []
+        with self._lock:
+            for host in dict.fromkeys(hosts):
+                cached = self._cache.get(host)
+                if not refresh and cached is not None and now - cached[1] < self.ttl:
+                    results[host] = cached[0]
+                else:
+                    pending.append(host)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                for host, result in zip(pending, pool.map(self._query, pending)):
+                    results[host] = result
+            now = time.monotonic()
+            with self._lock:
+                for host in pending:
+                    self._cache[host] = (results[host], now)
+        return results
+
+    def invalidate(self, host: Optional[str] = None) -> None:
+        """清除指定主机或全部主机的缓存"""
+        with self._lock:
+            if host is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(host, None)
+
+
+def same_user(session_user: str, username: str) -> bool:
+    """比较会话用户和连接用户名（忽略大小写和域前缀）"""
+    strip = lambda u: u.rsplit('\\', 1)[-1].split('@', 1)[0].lower()
+    return strip(session_user) == strip(username)
@@ -0,0 +1,27 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# rdp_manager 依赖 pywin32 的 win32com.shell；非Windows平台上只替换这一个模块
+try:
+    import win32com.shell  # noqa: F401
+except ImportError:
+    shell_module = types.ModuleType('win32com.shell')
+    shell_module.shell = types.SimpleNamespace(IsUserAnAdmin=lambda: False)
+    package = types.ModuleType('win32com')
+    package.shell = shell_module
+    sys.modules.setdefault('win32com', package)
+    sys.modules.setdefault('win32com.shell', shell_module)
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """把配置目录（~/.rdp_manager）放到临时目录"""
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('USERPROFILE', str(tmp_path))
+    return tmp_path
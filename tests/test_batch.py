@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def manager(home):
+    import rdp_manager
+
+    manager = rdp_manager.RDPManager()
+    manager.add_connection("web", "web01")
+    return manager
+
+
+def run(manager, *ops, **kwargs):
+    return manager.run_batch([json.dumps(op) for op in ops], **kwargs)
+
+
+def test_failed_line_rolls_back_every_change_by_default(manager):
+    before = manager.config_file.read_text()
+    results = run(manager,
+                  {"op": "add", "name": "db", "host": "db01"},
+                  {"op": "tag", "name": "web", "add": ["prod"]},
+                  {"op": "delete", "name": "missing"})
+    assert [r["ok"] for r in results] == [False, False, False]
+    assert [r["error"] for r in results[:2]] == ["批量操作已回滚"] * 2
+    assert manager.config_file.read_text() == before
+
+
+def test_non_atomic_batch_keeps_successful_lines(manager):
+    results = run(manager,
+                  {"op": "add", "name": "db", "host": "db01"},
+                  {"op": "delete", "name": "missing"},
+                  atomic=False)
+    assert [r["ok"] for r in results] == [True, False]
+    assert set(manager._load_config()) == {"web", "db"}
+
+
+def test_tag_add_and_remove(manager):
+    assert all(r["ok"] for r in run(manager, {"op": "tag", "name": "web", "add": ["prod", "web"]}))
+    assert manager._load_config()["web"]["tags"] == ["prod", "web"]
+    assert all(r["ok"] for r in run(manager, {"op": "tag", "name": "web",
+                                              "add": ["eu"], "remove": ["prod"]}))
+    assert manager._load_config()["web"]["tags"] == ["eu", "web"]
+    run(manager, {"op": "tag", "name": "web", "remove": ["eu", "web"]})
+    assert "tags" not in manager._load_config()["web"]
+
+
+@pytest.mark.parametrize("op", [
+    {"op": "add", "name": "db", "host": "db01", "tags": "web"},
+    {"op": "update", "name": "web", "tags": "web"},
+    {"op": "tag", "name": "web", "add": "web"},
+    {"op": "tag", "name": "web", "remove": ["web", 1]},
+])
+def test_tags_must_be_a_list_of_strings(manager, op):
+    [result] = run(manager, op)
+    assert not result["ok"]
+    assert "必须是字符串列表" in result["error"]
+    assert "tags" not in manager._load_config()["web"]
+
+
+def test_connect_honors_profile_and_check(manager, monkeypatch):
+    calls = []
+
+    def connect_many(names, profile=None, check_reachable=False, config=None):
+        calls.append((names, profile, check_reachable))
+        return dict.fromkeys(names)
+
+    manager.add_connection("db", "db01")
+    monkeypatch.setattr(manager, "connect_many", connect_many)
+    results = run(manager,
+                  {"op": "connect", "name": "web", "profile": "low", "check": True},
+                  {"op": "connect", "name": "db"})
+    assert all(r["ok"] for r in results)
+    assert calls == [(["web"], "low", True), (["db"], None, False)]
+
+
+@pytest.mark.parametrize("op, error", [
+    ({"op": "connect", "name": "web", "profile": "turbo"}, "未知的性能配置：turbo"),
+    ({"op": "connect", "name": "web", "check": "yes"}, "check必须是true或false"),
+])
+def test_connect_options_are_validated(manager, op, error):
+    [result] = run(manager, op)
+    assert result["error"] == error
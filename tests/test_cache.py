@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import rdp_cache
+from rdp_cache import RDPFileCache, cache_key
+
+
+def connection(host):
+    return {"host": host, "port": 3389, "username": "alice", "password": None}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RDPFileCache(tmp_path / 'rdp_cache', max_entries=2)
+
+
+def age(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+def test_hit_reuses_the_rendered_file(cache):
+    first = cache.get("web", connection("web01"), "lan")
+    assert cache.get("web", connection("web01"), "lan") == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert "full address:s:web01:3389" in first.read_text()
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    a = cache.get("a", connection("a01"), "lan")
+    b = cache.get("b", connection("b01"), "lan")
+    age(a, 1000)
+    age(b, 2000)
+    cache.get("a", connection("a01"), "lan")  # 命中后a成为最近使用
+    c = cache.get("c", connection("c01"), "lan")
+    assert a.exists() and c.exists()
+    assert not b.exists()
+    assert cache.stats()["connections"] == 2
+    cache.get("b", connection("b01"), "lan")
+    assert cache.misses == 4
+
+
+def test_size_limit_evicts_oldest_entries(tmp_path):
+    size = len(rdp_cache.render_rdp(connection("a01"), "lan").encode())
+    cache = RDPFileCache(tmp_path / 'rdp_cache', max_bytes=2 * size + size // 2)
+    a = cache.get("a", connection("a01"), "lan")
+    b = cache.get("b", connection("b01"), "lan")
+    age(a, 1000)
+    age(b, 2000)
+    c = cache.get("c", connection("c01"), "lan")
+    assert not a.exists()
+    assert b.exists() and c.exists()
+
+
+def test_new_file_is_kept_even_above_the_size_limit(tmp_path):
+    cache = RDPFileCache(tmp_path / 'rdp_cache', max_bytes=1)
+    a = cache.get("a", connection("a01"), "lan")
+    b = cache.get("b", connection("b01"), "lan")
+    assert b.exists()
+    assert not a.exists()
+
+
+def test_changed_connection_replaces_its_old_file(cache):
+    old = cache.get("web", connection("web01"), "lan")
+    new = cache.get("web", connection("web02"), "lan")
+    assert new != old
+    assert not old.exists()
+
+
+def test_template_change_invalidates_cached_files(cache, monkeypatch):
+    old = cache.get("web", connection("web01"), "lan")
+    monkeypatch.setattr(rdp_cache, "_TEMPLATE_DIGEST", "changed")
+    assert cache_key(connection("web01"), "lan") != old.stem
+    new = cache.get("web", connection("web01"), "lan")
+    assert new != old
+    assert cache.misses == 2
+    assert not old.exists()
+
+
+def test_invalidate_keeps_files_shared_with_other_connections(cache):
+    shared = cache.get("web", connection("web01"), "lan")
+    cache.get("web-alias", connection("web01"), "lan")
+    cache.invalidate("web")
+    assert shared.exists()
+    cache.invalidate("web-alias")
+    assert not shared.exists()
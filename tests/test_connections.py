@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from rdp_connections import SCHEMA_VERSION, Connection, ConnectionStore
+from rdp_profiles import DEFAULT_PROFILE
+
+CONFIG = {
+    "web": {"host": "web01", "port": 3390, "username": "alice", "password": "token",
+            "profile": "lan", "tags": ["prod", "web"], "schema": SCHEMA_VERSION},
+    "db": {"host": "db01", "port": 3389, "username": "bob", "password": None,
+           "profile": "low", "schema": SCHEMA_VERSION},
+    "jump": {"host": "jump01", "port": 22000, "username": "alice", "password": None,
+             "profile": "auto", "tags": ["ops"], "schema": SCHEMA_VERSION},
+}
+
+
+def test_round_trip_preserves_records_and_order():
+    store = ConnectionStore.from_config(CONFIG)
+    assert store.to_config() == CONFIG
+    assert list(store.to_config()) == ["web", "db", "jump"]
+    assert not store.invalid
+
+
+def test_legacy_records_get_defaults():
+    store = ConnectionStore.from_config({"old": {"host": "h1", "username": "u"}})
+    connection = store.get("old")
+    assert (connection.port, connection.profile, connection.tags) == (3389, DEFAULT_PROFILE, ())
+    assert store.to_config()["old"]["schema"] == SCHEMA_VERSION
+
+
+def test_remove_keeps_remaining_rows_and_tags_aligned():
+    store = ConnectionStore.from_config(CONFIG)
+    store.remove("web")
+    assert store.names() == ["db", "jump"]
+    assert store.get("jump").tags == ("ops",)
+    assert store.get("db").tags == ()
+    assert store.to_config() == {name: CONFIG[name] for name in ("db", "jump")}
+    with pytest.raises(KeyError):
+        store.remove("web")
+
+
+def test_add_replaces_existing_connection():
+    store = ConnectionStore.from_config(CONFIG)
+    store.add(Connection("db", "db02", 3391, "carol"))
+    assert len(store) == 3
+    assert store.get("db").host == "db02"
+    assert store.names() == ["web", "db", "jump"]
+
+
+@pytest.mark.parametrize("record, reason", [
+    ({"username": "u"}, "缺少字段：host"),
+    ({"host": "h", "port": "abc"}, "端口必须是1-65535之间的数字"),
+    ({"host": "h", "profile": "turbo"}, "未知的性能配置：turbo"),
+])
+def test_invalid_records_are_skipped(record, reason):
+    store = ConnectionStore.from_config(dict(CONFIG, bad=record))
+    assert store.invalid == {"bad": reason}
+    assert "bad" not in store
+    assert store.names() == ["web", "db", "jump"]
+
+
+def test_manager_skips_records_without_host(home):
+    import rdp_manager
+
+    manager = rdp_manager.RDPManager()
+    manager.config_file.write_text(json.dumps({"bad": {"username": "u"}}))
+    assert manager.pre_resolve(manager._load_config(), ["bad"]) == {}
+    assert manager.probe() == {}
+    results = manager.run_batch([json.dumps({"op": "probe", "name": "bad"}),
+                                 json.dumps({"op": "connect", "name": "bad"})])
+    assert [r["error"] for r in results] == ["bad 的配置无效：缺少字段：host"] * 2
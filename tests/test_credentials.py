@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+import rdp_credentials
+from rdp_credentials import CONFLICT, Credential, CredentialSync, FakeCredentialBackend
+
+ALICE = Credential("web", "web01", "alice", "s3cret")
+BOB = Credential("db", "db01", "bob", "hunter2")
+
+
+@pytest.fixture
+def backend():
+    return FakeCredentialBackend()
+
+
+@pytest.fixture
+def ledger_file(tmp_path):
+    return tmp_path / 'cred_ledger.json'
+
+
+def test_first_sync_writes_every_credential(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    assert sync.sync([ALICE, BOB]) == {"web": "written", "db": "written"}
+    assert backend.store == {"TERMSRV/web01": ("alice", "s3cret"),
+                             "TERMSRV/db01": ("bob", "hunter2")}
+
+
+def test_unchanged_credentials_are_skipped(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    sync.sync([ALICE, BOB])
+    assert sync.sync([ALICE, BOB]) == {"web": "unchanged", "db": "unchanged"}
+    assert backend.write_count == 2
+
+
+def test_changed_password_is_rewritten(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    sync.sync([ALICE])
+    assert sync.sync([ALICE._replace(password="new")]) == {"web": "written"}
+    assert backend.store["TERMSRV/web01"] == ("alice", "new")
+
+
+def test_force_rewrites_unchanged_credentials(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    sync.sync([ALICE])
+    assert sync.sync([ALICE], force=True) == {"web": "written"}
+    assert backend.write_count == 2
+
+
+def test_ledger_survives_restart_and_holds_no_plaintext(backend, ledger_file):
+    CredentialSync(backend, ledger_file, b'key').sync([ALICE])
+    assert "s3cret" not in ledger_file.read_text()
+    restarted = CredentialSync(backend, ledger_file, b'key')
+    assert restarted.sync([ALICE]) == {"web": "unchanged"}
+
+
+def test_ledger_digest_depends_on_secret(backend, ledger_file):
+    CredentialSync(backend, ledger_file, b'key').sync([ALICE])
+    assert CredentialSync(backend, ledger_file, b'other').sync([ALICE]) == {"web": "written"}
+
+
+def test_failed_write_reports_error_and_retries_next_time(ledger_file):
+    class FlakyBackend(FakeCredentialBackend):
+        fail = True
+
+        def write(self, target, username, password):
+            if self.fail:
+                raise OSError("拒绝访问")
+            super().write(target, username, password)
+
+    backend = FlakyBackend()
+    sync = CredentialSync(backend, ledger_file, b'key')
+    assert sync.sync([ALICE]) == {"web": "拒绝访问"}
+    assert json.loads(ledger_file.read_text()) == {}
+    backend.fail = False
+    assert sync.sync([ALICE]) == {"web": "written"}
+
+
+def test_forget_removes_credential_and_ledger_entry(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    sync.sync([ALICE, BOB])
+    sync.forget("web01")
+    assert "TERMSRV/web01" not in backend.store
+    assert "TERMSRV/web01" not in json.loads(ledger_file.read_text())
+    assert sync.sync([ALICE]) == {"web": "written"}
+
+
+def test_manager_forgets_credentials_no_longer_saved(home):
+    import rdp_manager
+
+    manager = rdp_manager.RDPManager()
+    backend = manager.credentials.backend = FakeCredentialBackend()
+    manager.add_connection("a", "h1", password="pw")
+    manager.add_connection("b", "h1", password="pw")
+    manager.add_connection("c", "h2", password="pw")
+    manager.sync_credentials()
+    assert set(backend.store) == {"TERMSRV/h1", "TERMSRV/h2"}
+
+    results = manager.run_batch([
+        json.dumps({"op": "delete", "name": "a"}),         # h1 仍被b使用
+        json.dumps({"op": "update", "name": "c", "password": ""}),
+    ])
+    assert all(r["ok"] for r in results)
+    assert set(backend.store) == {"TERMSRV/h1"}
+
+    manager.run_batch([json.dumps({"op": "delete", "name": "b"})])
+    assert backend.store == {}
+
+
+def test_credentials_sharing_a_target_are_written_once(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    alias = ALICE._replace(name="web-alias")
+    assert sync.sync([ALICE, alias]) == {"web": "written", "web-alias": "written"}
+    assert backend.write_count == 1
+
+
+def test_conflicting_accounts_for_one_target_are_not_written(backend, ledger_file):
+    sync = CredentialSync(backend, ledger_file, b'key')
+    other = Credential("web-admin", "web01", "root", "toor")
+    assert sync.sync([ALICE, other, BOB]) == {"web": CONFLICT, "web-admin": CONFLICT,
+                                              "db": "written"}
+    assert "TERMSRV/web01" not in backend.store
+
+
+def test_default_backend_never_falls_back_to_memory(monkeypatch, ledger_file):
+    monkeypatch.setattr(rdp_credentials, "win32cred", None)
+    sync = CredentialSync(rdp_credentials.default_backend(), ledger_file, b'key')
+    assert sync.sync([ALICE]) == {"web": "未安装pywin32，无法写入Windows凭据管理器"}
+    assert json.loads(ledger_file.read_text()) == {}
+
+
+def test_manager_keeps_prompting_for_conflicting_connections(home):
+    import rdp_manager
+
+    manager = rdp_manager.RDPManager()
+    backend = manager.credentials.backend = FakeCredentialBackend()
+    manager.add_connection("a", "h1", username="alice", password="pw")
+    manager.add_connection("b", "h1", username="bob", password="pw")
+    config = manager._load_config()
+    # 只同步一个连接时也要发现同一主机上的另一个账户
+    assert manager.sync_credentials(["a"]) == {"a": CONFLICT}
+    assert backend.store == {}
+    rdp_file = manager.rdp_cache.get("a", manager._prompting(config["a"], CONFLICT), "lan")
+    assert "prompt for credentials:i:1" in rdp_file.read_text()
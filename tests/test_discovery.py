@@ -0,0 +1,164 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from rdp_discovery import (X224_CONNECTION_REQUEST, candidate_ports, check_rdp,
+                           discover_ports, parse_ports)
+
+# TPKT + X.224连接确认 + RDP_NEG_RSP（选择PROTOCOL_SSL）
+CONNECTION_CONFIRM = bytes([
+    0x03, 0x00, 0x00, 0x13,
+    0x0e, 0xd0, 0x00, 0x00, 0x12, 0x34, 0x00,
+    0x02, 0x00, 0x08, 0x00, 0x01, 0x00, 0x00, 0x00,
+])
+
+
+class Responder:
+    """本地替身服务：按端口返回连接确认、非RDP横幅或者不回复"""
+
+    def __init__(self):
+        self.requests = []
+        self._sockets = []
+        self._stop = threading.Event()
+
+    def listen(self, reply):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(16)
+        sock.settimeout(0.1)
+        self._sockets.append(sock)
+        threading.Thread(target=self._serve, args=(sock, reply), daemon=True).start()
+        return sock.getsockname()[1]
+
+    def _serve(self, sock, reply):
+        held = []
+        while not self._stop.is_set():
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                continue
+            conn.settimeout(1)
+            try:
+                self.requests.append(conn.recv(64))
+            except OSError:
+                pass
+            if reply is None:
+                held.append(conn)  # 不回复，也不关闭
+                continue
+            conn.sendall(reply)
+            conn.close()
+        for conn in held:
+            conn.close()
+
+    def close(self):
+        self._stop.set()
+        for sock in self._sockets:
+            sock.close()
+
+
+@pytest.fixture
+def responder():
+    responder = Responder()
+    yield responder
+    responder.close()
+
+
+@pytest.fixture
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def run(coro):
+    import asyncio
+    return asyncio.run(coro)
+
+
+def test_connection_confirm_is_rdp(responder):
+    port = responder.listen(CONNECTION_CONFIRM)
+    assert run(check_rdp('127.0.0.1', port, timeout=1))
+    assert responder.requests[0] == X224_CONNECTION_REQUEST
+
+
+def test_non_rdp_banner_is_rejected(responder):
+    port = responder.listen(b"SSH-2.0-OpenSSH_9.6\r\n")
+    assert not run(check_rdp('127.0.0.1', port, timeout=1))
+
+
+def test_silent_port_times_out(responder):
+    port = responder.listen(None)
+    assert not run(check_rdp('127.0.0.1', port, timeout=0.3))
+
+
+def test_closed_port_is_rejected(closed_port):
+    assert not run(check_rdp('127.0.0.1', closed_port, timeout=1))
+
+
+def test_discover_prefers_candidate_order(responder, closed_port):
+    banner = responder.listen(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+    silent = responder.listen(None)
+    first = responder.listen(CONNECTION_CONFIRM)
+    second = responder.listen(CONNECTION_CONFIRM)
+    results = discover_ports({
+        "a": ('127.0.0.1', [closed_port, banner, silent, first, second]),
+        "b": ('127.0.0.1', [second, first]),
+        "c": ('127.0.0.1', [banner, silent]),
+    }, timeout=0.5)
+    assert results == {"a": first, "b": second, "c": None}
+
+
+def test_discover_empty_targets():
+    assert discover_ports({}) == {}
+
+
+def test_parse_ports():
+    assert parse_ports("3389, 3390-3392,3389,") == [3389, 3390, 3391, 3392]
+
+
+@pytest.mark.parametrize("spec", ["abc", "3389-", "0", "65536", "3400-3390", "1-5000"])
+def test_parse_ports_errors(spec):
+    with pytest.raises(ValueError):
+        parse_ports(spec)
+
+
+def test_candidate_ports_saved_port_first():
+    assert candidate_ports(3390, [3389, 3390, 3391]) == [3390, 3389, 3391]
+
+
+def test_manager_writes_back_changed_ports(home, responder, closed_port):
+    import rdp_manager
+
+    rdp_port = responder.listen(CONNECTION_CONFIRM)
+    manager = rdp_manager.RDPManager()
+    for name, port in (("stale", closed_port), ("current", rdp_port), ("gone", closed_port)):
+        manager.add_connection(name, '127.0.0.1', port=port)
+    manager.add_connection("unresolved", 'no-such-host.invalid')
+    manager.rdp_cache.get("stale", manager._load_config()["stale"], "lan")
+
+    results = manager.discover_ports(["stale", "current", "unresolved"], [rdp_port], timeout=0.5)
+
+    assert results == {"stale": (closed_port, rdp_port), "current": (rdp_port, rdp_port)}
+    config = json.loads(manager.config_file.read_text())
+    assert config["stale"]["port"] == rdp_port
+    assert config["current"]["port"] == rdp_port
+    assert config["gone"]["port"] == closed_port  # 未参与探测
+    assert "stale" not in manager.rdp_cache._load_index()
+
+
+def test_manager_dry_run_does_not_write(home, responder, closed_port):
+    import rdp_manager
+
+    rdp_port = responder.listen(CONNECTION_CONFIRM)
+    manager = rdp_manager.RDPManager()
+    manager.add_connection("stale", '127.0.0.1', port=closed_port)
+    before = manager.config_file.read_bytes()
+
+    results = manager.discover_ports(None, [rdp_port], timeout=0.5, write=False)
+
+    assert results == {"stale": (closed_port, rdp_port)}
+    assert manager.config_file.read_bytes() == before
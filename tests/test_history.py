@@ -0,0 +1,67 @@
+import pytest
+
+from rdp_history import COMPACT_BYTES, MAX_SAMPLES, HistoryStore, percentile
+
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryStore(tmp_path)
+
+
+@pytest.mark.parametrize("samples, pct, expected", [
+    ([], 50, None),
+    ([7.0], 95, 7.0),
+    ([3.0, 1.0, 2.0], 0, 1.0),
+    (list(range(1, 11)), 50, 5),
+    (list(range(1, 11)), 95, 10),
+    (list(range(1, 101)), 95, 95),
+    (list(range(1, 11)), 100, 10),
+])
+def test_percentile_uses_nearest_rank(samples, pct, expected):
+    assert percentile(samples, pct) == expected
+
+
+def test_host_stats_aggregate_connections_on_the_same_host(history):
+    for ms in (100, 200, 300):
+        history.record("web", "web01", ms)
+    history.record("web-admin", "web01", 400)
+    history.record("web-admin", "web01", None, ok=False)
+    history.record("db", "db01", 50)
+    assert history.host_stats() == [
+        {"host": "db01", "count": 1, "failures": 0, "failure_rate": 0.0, "p50": 50, "p95": 50},
+        {"host": "web01", "count": 5, "failures": 1, "failure_rate": 0.2, "p50": 200, "p95": 400},
+    ]
+
+
+def test_log_is_compacted_once_it_reaches_the_threshold(history):
+    records = 0
+    while not history.index_file.exists():
+        before = history.log_file.stat().st_size if history.log_file.exists() else 0
+        history.record("web", "web01", 100.0 + records % 50, 12.5)
+        records += 1
+    # 只在追加的这一行让日志达到阈值时才压缩
+    assert before < COMPACT_BYTES < before + 100
+    assert history.log_file.read_text() == ""
+    history.record("web", "web01", 100.0)
+    entry = history.summary()["web"]
+    assert entry["count"] == records + 1
+    assert len(entry["samples"]) == MAX_SAMPLES
+
+
+def test_summary_combines_index_and_pending_log(history):
+    history.record("web", "web01", 100.0)
+    history.compact()
+    history.record("web", "web01", 200.0, ok=False)
+    entry = history.summary()["web"]
+    assert (entry["count"], entry["failures"], entry["samples"]) == (2, 1, [100.0, 200.0])
+
+
+def test_order_by_recency_and_frequency(history, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr("rdp_history.time.time", lambda: next(clock))
+    for name in ("a", "b", "b", "c"):
+        history.record(name, name, 10.0)
+    assert history.order(["a", "b", "c", "new"], "recency") == ["c", "b", "a", "new"]
+    assert history.order(["a", "b", "c"], "frequency")[0] == "b"
+    with pytest.raises(ValueError):
+        history.order(["a"], "name")
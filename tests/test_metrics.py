@@ -0,0 +1,72 @@
+import urllib.request
+
+import pytest
+
+from rdp_metrics import MetricsRegistry, MetricsServer
+
+
+@pytest.fixture
+def metrics():
+    return MetricsRegistry()
+
+
+def test_histogram_buckets_are_cumulative(metrics):
+    latency = metrics.histogram("op_seconds", "耗时", ("operation",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, operation="enable")
+    assert metrics.render().splitlines() == [
+        "# HELP op_seconds 耗时",
+        "# TYPE op_seconds histogram",
+        'op_seconds_bucket{operation="enable",le="0.1"} 1',
+        'op_seconds_bucket{operation="enable",le="1.0"} 3',
+        'op_seconds_bucket{operation="enable",le="+Inf"} 4',
+        'op_seconds_sum{operation="enable"} 4.05',
+        'op_seconds_count{operation="enable"} 4',
+    ]
+
+
+def test_label_values_are_escaped(metrics):
+    up = metrics.gauge("host_up", "可达", ("name",))
+    up.set(1, name='say "hi"\\n\nnext')
+    assert 'host_up{name="say \\"hi\\"\\\\n\\nnext"} 1' in metrics.render().splitlines()
+
+
+def test_labels_must_match_declaration(metrics):
+    runs = metrics.counter("runs_total", "次数", ("command",))
+    with pytest.raises(ValueError):
+        runs.inc(cmd="sc")
+
+
+def test_persist_accumulates_counters_across_processes(tmp_path):
+    state_file = tmp_path / 'metrics.json'
+    for _ in range(2):  # 两个独立进程各执行一次命令
+        metrics = MetricsRegistry()
+        metrics.counter("runs_total", "次数", ("command",)).inc(command="sc")
+        metrics.histogram("op_seconds", "耗时", buckets=(1.0,)).observe(0.5)
+        state = metrics.persist(state_file)
+    assert 'runs_total{command="sc"} 2' in metrics.render(state)
+    assert 'op_seconds_count 2' in metrics.render(state)
+    # 再次持久化只累加新的变化
+    assert 'runs_total{command="sc"} 2' in metrics.render(metrics.persist(state_file))
+
+
+def test_persist_drops_removed_gauges(metrics, tmp_path):
+    state_file = tmp_path / 'metrics.json'
+    latency = metrics.gauge("latency_seconds", "延迟", ("host",))
+    latency.set(0.02, host="web01")
+    metrics.persist(state_file)
+    latency.remove(host="web01")
+    assert "web01" not in metrics.render(metrics.persist(state_file))
+
+
+def test_server_renders_on_each_scrape(metrics):
+    runs = metrics.counter("runs_total", "次数")
+    server = MetricsServer(0, render=metrics.render)
+    server.start()
+    try:
+        runs.inc()
+        url = "http://%s:%d/metrics" % server._server.server_address
+        body = urllib.request.urlopen(url, timeout=5).read().decode('utf-8')
+    finally:
+        server.stop()
+    assert "runs_total 1" in body
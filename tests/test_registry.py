@@ -0,0 +1,82 @@
+import pytest
+
+from rdp_registry import DEFAULT_PORT, RDP_TCP_KEY, TS_KEY, FakeRegistry, RDPState
+
+
+@pytest.fixture
+def registry():
+    return FakeRegistry({
+        (TS_KEY, "fDenyTSConnections"): 0,
+        (RDP_TCP_KEY, "UserAuthentication"): 1,
+        (RDP_TCP_KEY, "PortNumber"): 13389,
+    })
+
+
+class ServiceProbe:
+    """记录调用次数的服务状态探测"""
+
+    def __init__(self, running=True):
+        self.running = running
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.running
+
+
+def test_snapshot_combines_registry_and_service(registry):
+    snapshot = RDPState(registry, ServiceProbe()).snapshot()
+    assert snapshot.deny_connections is False
+    assert snapshot.user_authentication is True
+    assert snapshot.port == 13389
+    assert snapshot.service_running is True
+
+
+def test_repeated_reads_within_ttl_hit_cache(registry):
+    probe = ServiceProbe()
+    state = RDPState(registry, probe, ttl=60)
+    first = state.snapshot()
+    for _ in range(5):
+        assert state.snapshot() is first
+    assert (registry.read_count, probe.calls) == (1, 1)
+
+
+def test_zero_ttl_reads_every_time(registry):
+    state = RDPState(registry, ttl=0)
+    state.snapshot()
+    state.snapshot()
+    assert registry.read_count == 2
+
+
+def test_force_rereads_registry_and_service(registry):
+    probe = ServiceProbe()
+    state = RDPState(registry, probe, ttl=60)
+    state.snapshot()
+    probe.running = False
+    assert state.snapshot(force=True).service_running is False
+    assert (registry.read_count, probe.calls) == (2, 2)
+
+
+def test_set_value_writes_through_and_invalidates(registry):
+    state = RDPState(registry, ttl=60)
+    state.snapshot()
+    state.set_value("PortNumber", 3390)
+    assert registry.values[(RDP_TCP_KEY, "PortNumber")] == 3390
+    assert registry.write_count == 1
+    assert state.snapshot().port == 3390
+    assert registry.read_count == 2
+
+
+def test_set_value_rejects_unknown_name(registry):
+    state = RDPState(registry)
+    with pytest.raises(KeyError):
+        state.set_value("Unknown", 1)
+    assert registry.write_count == 0
+
+
+def test_missing_values_fall_back_to_disabled_defaults():
+    snapshot = RDPState(FakeRegistry()).snapshot()
+    assert snapshot.deny_connections is True
+    assert snapshot.user_authentication is False
+    assert snapshot.port == DEFAULT_PORT
+    assert snapshot.service_running is False
@@ -0,0 +1,92 @@
+import pytest
+
+from rdp_sessions import (ACTIVE, DISCONNECTED, FakeSessionBackend, Session, SessionInventory,
+                          parse_qwinsta, same_user)
+
+HEADER_EN = " SESSIONNAME       USERNAME                 ID  STATE   TYPE        DEVICE"
+HEADER_ZH = " 会话名            用户名                   ID  状态    类型        设备"
+
+
+@pytest.mark.parametrize("line, expected", [
+    (">console           alice                     1  Active", Session(1, "alice", ACTIVE, "console")),
+    (" rdp-tcp#3         bob                       2  Active", Session(2, "bob", ACTIVE, "rdp-tcp#3")),
+    ("                   carol                     3  Disc", Session(3, "carol", DISCONNECTED, "")),
+    (">console           张三                      1  运行中", Session(1, "张三", ACTIVE, "console")),
+    (" rdp-tcp#5         lisi                      2  活动", Session(2, "lisi", ACTIVE, "rdp-tcp#5")),
+    ("                   wangwu                    4  已断开", Session(4, "wangwu", DISCONNECTED, "")),
+    ("                   zhao                      5  断开", Session(5, "zhao", DISCONNECTED, "")),
+])
+def test_parse_qwinsta_session_lines(line, expected):
+    header = HEADER_ZH if any(ord(c) > 127 for c in line) else HEADER_EN
+    assert parse_qwinsta(f"{header}\n{line}\n") == [expected]
+
+
+@pytest.mark.parametrize("line", [
+    " services                                    0  Disc",
+    " rdp-tcp                                 65536  Listen",
+    " rdp-tcp                                 65536  侦听",
+    " console                                     1  Conn",
+])
+def test_parse_qwinsta_skips_system_and_listener_sessions(line):
+    assert parse_qwinsta(f"{HEADER_EN}\n{line}\n") == []
+
+
+def test_parse_qwinsta_ignores_header_and_blank_output():
+    assert parse_qwinsta(HEADER_EN) == []
+    assert parse_qwinsta("") == []
+
+
+@pytest.fixture
+def backend():
+    return FakeSessionBackend({"web": [Session(2, "alice", ACTIVE)], "db": []})
+
+
+def test_query_all_collects_results_and_errors(backend):
+    results = SessionInventory(backend).query_all(["web", "db", "offline"])
+    assert results["web"] == [Session(2, "alice", ACTIVE)]
+    assert results["db"] == []
+    assert isinstance(results["offline"], ConnectionError)
+
+
+def test_duplicate_hosts_are_queried_once(backend):
+    SessionInventory(backend).query_all(["web", "web", "db", "web"])
+    assert backend.query_count == 2
+
+
+def test_results_and_errors_cached_until_ttl(backend):
+    inventory = SessionInventory(backend, ttl=60)
+    inventory.query_all(["web", "offline"])
+    backend.sessions["offline"] = []
+    assert isinstance(inventory.query_all(["offline"])["offline"], ConnectionError)
+    assert backend.query_count == 2
+
+    assert inventory.query_all(["offline"], refresh=True)["offline"] == []
+    assert backend.query_count == 3
+
+
+def test_expired_entries_are_requeried(backend):
+    inventory = SessionInventory(backend, ttl=0)
+    inventory.query_all(["web"])
+    inventory.query_all(["web"])
+    assert backend.query_count == 2
+
+
+def test_invalidate_one_host_or_all(backend):
+    inventory = SessionInventory(backend, ttl=60)
+    inventory.query_all(["web", "db"])
+    inventory.invalidate("web")
+    inventory.query_all(["web", "db"])
+    assert backend.query_count == 3
+    inventory.invalidate()
+    inventory.query_all(["web", "db"])
+    assert backend.query_count == 5
+
+
+@pytest.mark.parametrize("session_user, username, expected", [
+    ("CORP\\Alice", "alice", True),
+    ("alice", "CORP\\alice", True),
+    ("alice@corp.example", "ALICE", True),
+    ("bob", "alice", False),
+])
+def test_same_user(session_user, username, expected):
+    assert same_user(session_user, username) is expected